@@ -12,6 +12,16 @@ from config import config
 from flask_login import LoginManager
 from flask_pagedown import PageDown
 from flask_debugtoolbar import DebugToolbarExtension 
+from .write_behind import ZanBuffer
+from .follow_cache import FollowGraphCache
+from .search_cache import SearchCache
+from .username_index import UsernameIndex
+from .render import RenderCache
+from .identity_cache import IdentityCache
+from .presence import PresenceTracker
+from .hashing import PasswordHasher
+from .claims import PermissionClaims
+from .mail_queue import MailQueue
 bootstrap = Bootstrap()
 mail = Mail()
 moment = Moment()
@@ -20,6 +30,16 @@ login_manager = LoginManager()
 login_manager.login_view = 'auth.login' 
 pagedown = PageDown()
 toolbar = DebugToolbarExtension()
+zan_buffer = ZanBuffer()
+follow_graph = FollowGraphCache()
+search_cache = SearchCache()
+username_index = UsernameIndex()
+render_cache = RenderCache()
+identity_cache = IdentityCache()
+presence = PresenceTracker()
+hasher = PasswordHasher()
+permission_claims = PermissionClaims()
+mail_queue = MailQueue()
 
 def create_app(config_name):
     app = Flask(__name__) 
@@ -33,6 +53,16 @@ def create_app(config_name):
     login_manager.init_app(app)
     pagedown.init_app(app)
     toolbar.init_app(app)
+    zan_buffer.init_app(app)
+    follow_graph.init_app(app)
+    search_cache.init_app(app)
+    username_index.init_app(app)
+    render_cache.init_app(app)
+    identity_cache.init_app(app)
+    presence.init_app(app)
+    hasher.init_app(app)
+    permission_claims.init_app(app)
+    mail_queue.init_app(app)
    
     from .main import main as main_blueprint 
     app.register_blueprint(main_blueprint)
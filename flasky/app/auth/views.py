@@ -14,7 +14,8 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user is not None and user.verify_password(form.password.data)
+        if user is not None and user.verify_password(form.password.data):
+            db.session.commit()
             login_user(user, form.remember_me.data)
             next = request.args.get('next') 
             if next is None or not next.startswith('/'):
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+
+"""会话中的权限声明：把角色权限和角色版本存进已签名的会话cookie，权限检查不必读角色"""
+
+from flask import session
+from flask_login import current_user
+from . import ttl_cache
+from .ttl_cache import TTLCache
+
+CLAIM_KEY = '_permissions'
+
+
+class PermissionClaims:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.reloads = 0
+        self._epoch = TTLCache(max_size=1, ttl=5)  # 所有角色的最大版本号
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('FLASKY_PERMISSION_CLAIMS', False)
+        # 其他进程修改角色后，本进程最多过ttl秒才能看到新版本
+        self._epoch.ttl = app.config.get('FLASKY_ROLE_VERSION_TTL', 5)
+        self.clear()
+
+    def clear(self):
+        self._epoch.clear()
+
+    def epoch(self):
+        """所有角色的最大版本号，任何角色的权限变化或用户换角色都会使它增大"""
+        from .models import Role
+        from . import db
+        return self._epoch.get('epoch', lambda: db.session.query(
+            db.func.max(Role.version)).scalar() or 0)
+
+    def permissions(self):
+        """当前用户的权限位；声明有效时不访问用户和角色"""
+        # Flask-Login 0.4用user_id作会话中的键，0.5起改为_user_id
+        user_id = session.get('_user_id', session.get('user_id'))
+        claim = session.get(CLAIM_KEY)
+        if user_id is not None and claim is not None and claim.get('user') == user_id \
+                and claim.get('epoch') == self.epoch():
+            return claim['permissions']
+        if not current_user.is_authenticated:
+            return 0
+        self.reloads += 1
+        role = current_user.role
+        permissions = role.permissions if role is not None else 0
+        session[CLAIM_KEY] = {'user': current_user.get_id(), 'epoch': self.epoch(),
+                              'permissions': permissions}
+        return permissions
+
+    def can(self, permission):
+        if not self.enabled:
+            return current_user.can(permission)
+        return self.permissions() & permission == permission
+
+    def stats(self):
+        return {'enabled': self.enabled, 'reloads': self.reloads,
+                'epoch_hits': self._epoch.hits, 'epoch_misses': self._epoch.misses}
+
+    # 角色版本在提交后才对其他请求可见，提交后清掉本进程缓存的版本号
+    def register(self, user_model, role_model):
+        from . import db
+        db.event.listen(role_model, 'after_update', self.on_change)
+        db.event.listen(user_model, 'after_update', self.on_change)
+        ttl_cache.register()
+
+    def on_change(self, mapper, connection, target):
+        ttl_cache.invalidate_on_commit(target, self._epoch)
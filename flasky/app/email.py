@@ -2,24 +2,16 @@
 
 """电子邮件支持函数"""
 
-from . import mail 
+from . import mail_queue
 
 
 from flask_mail import Message
 from flask import render_template, current_app
-from threading import Thread
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg) 
 
 def send_email(to, subject, template, **kwargs):
+    """渲染邮件并放进发送队列，返回是否成功入队；不开工作线程时返回是否发出"""
     app = current_app._get_current_object()
     msg = Message(app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + '' + subject, sender=app.config['FLASKY_MAIL_SENDER'], recipients=[to])
-    msg.boby = render_template(template + '.txt', **kwargs)
+    msg.body = render_template(template + '.txt', **kwargs)
     msg.html = render_template(template + '.html', **kwargs)
-    thr = Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
-
-
+    return mail_queue.submit(msg)
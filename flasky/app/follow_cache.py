@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+
+"""进程内关注关系缓存：每个用户的关注集合与粉丝集合，按LRU淘汰"""
+
+from .ttl_cache import TTLCache
+
+
+class FollowGraphCache(TTLCache):
+    def __init__(self, app=None):
+        TTLCache.__init__(self, max_size=10000, ttl=60)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config.get('FLASKY_FOLLOW_CACHE_SIZE', 10000)
+        self.ttl = app.config.get('FLASKY_FOLLOW_CACHE_TTL', 60)
+        self.clear()
+
+    def followed(self, user_id):
+        return self._get(user_id)[0]
+
+    def followers(self, user_id):
+        return self._get(user_id)[1]
+
+    def is_following(self, follower_id, followed_id):
+        return followed_id in self.followed(follower_id)
+
+    def _get(self, user_id):
+        from .models import Follow
+        from . import db
+
+        def load():
+            followed = frozenset(row[0] for row in db.session.query(
+                Follow.followed_id).filter(Follow.follower_id == user_id))
+            followers = frozenset(row[0] for row in db.session.query(
+                Follow.follower_id).filter(Follow.followed_id == user_id))
+            return followed, followers
+        return self.get(user_id, load)
+
+    def stats(self):
+        return {'users': len(self), 'hits': self.hits, 'misses': self.misses}
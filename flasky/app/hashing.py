@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+"""密码散列服务：在有界的线程池里计算PBKDF2，请求线程只等待结果"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:150000'
+        self.workers = 0
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._latency = {'hash': deque(maxlen=1000), 'verify': deque(maxlen=1000)}
+        self.rehashed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = '%s:%d' % (app.config.get('FLASKY_PASSWORD_METHOD', 'pbkdf2:sha256'),
+                                 app.config.get('FLASKY_PASSWORD_ITERATIONS', 150000))
+        # 为0时在请求线程里直接计算
+        self.workers = app.config.get('FLASKY_PASSWORD_WORKERS', 0)
+        # 同时在池中排队的任务数上限，超出时请求线程在此等待，不会无限堆积
+        self.max_pending = app.config.get('FLASKY_PASSWORD_MAX_PENDING', 64)
+        self.shutdown()
+        if self.workers > 0:
+            # hashlib.pbkdf2_hmac计算时释放GIL，线程足以并行；
+            # 线程在第一次提交时才启动，在fork之前创建线程池也没有问题
+            with self._lock:
+                self._pool = ThreadPoolExecutor(self.workers,
+                                                thread_name_prefix='password-hasher')
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def _run(self, kind, fn, *args):
+        start = time.perf_counter()
+        if self.workers <= 0:
+            result = fn(*args)
+        else:
+            pool, slots = self._pool, self._slots
+            with slots:
+                result = pool.submit(fn, *args).result()
+        self._latency[kind].append(time.perf_counter() - start)
+        return result
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run('verify', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """散列方法或迭代次数与当前配置不同"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def note_rehash(self):
+        """记录一次重新散列，多个请求线程会同时调用"""
+        with self._lock:
+            self.rehashed += 1
+
+    def stats(self):
+        stats = {'method': self.method, 'workers': self.workers,
+                 'rehashed': self.rehashed}
+        for kind, samples in self._latency.items():
+            samples = list(samples)
+            stats[kind] = dict([('count', len(samples))] + [
+                ('p%d_ms' % p, round(percentile(samples, p) * 1000, 2)
+                 if samples else None) for p in (50, 90, 99)])
+        return stats
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+"""进程内登录用户缓存：按用户id缓存连同角色一起加载的用户，短时间过期"""
+
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from . import ttl_cache
+from .ttl_cache import TTLCache
+
+
+def detached_copy(obj):
+    # 只复制列属性，得到一个游离状态、可以merge(load=False)进任意会话的对象
+    mapper = obj.__mapper__
+    copy = mapper.class_manager.new_instance()
+    for attr in mapper.column_attrs:
+        set_committed_value(copy, attr.key, getattr(obj, attr.key))
+    make_transient_to_detached(copy)
+    return copy
+
+
+class IdentityCache(TTLCache):
+    def __init__(self, app=None):
+        TTLCache.__init__(self, max_size=10000, ttl=0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config.get('FLASKY_IDENTITY_CACHE_SIZE', 10000)
+        # 默认为0，不缓存；多进程部署时开启意味着封禁、降权最多晚ttl秒生效
+        self.ttl = app.config.get('FLASKY_IDENTITY_CACHE_TTL', 0)
+        self.clear()
+
+    def load(self, user_id):
+        """返回当前会话中的用户，角色已加载；命中缓存时不查询数据库"""
+        from .models import User
+        from . import db
+        session = db.session()
+        user = session.identity_map.get(session.identity_key(User, user_id))
+        if user is not None:
+            return user
+        if self.ttl <= 0:
+            return User.query.options(joinedload(User.role)).get(user_id)
+        loaded = []
+
+        def load():
+            user = User.query.options(joinedload(User.role)).get(user_id)
+            if user is None:
+                return None
+            loaded.append(user)
+            cached = detached_copy(user)
+            # 没有角色时也写入None，merge后role是已加载的状态，不再走延迟加载
+            set_committed_value(cached, 'role', detached_copy(user.role)
+                                if user.role is not None else None)
+            return cached
+        cached = self.get(user_id, load)
+        if loaded:
+            return loaded[0]
+        return session.merge(cached, load=False) if cached is not None else None
+
+    def stats(self):
+        return {'users': len(self), 'hits': self.hits, 'misses': self.misses}
+
+    # 以下为同步User、Role写入的事件
+    def register(self, user_model, role_model):
+        from . import db
+        db.event.listen(user_model, 'after_update', self.on_user_update)
+        db.event.listen(user_model, 'after_delete', self.on_user_delete)
+        db.event.listen(role_model, 'after_update', self.on_role_change)
+        db.event.listen(role_model, 'after_delete', self.on_role_change)
+        ttl_cache.register()
+
+    def on_user_update(self, mapper, connection, target):
+        from . import db
+        # 只更新last_seen时不失效，否则每个请求都会清掉自己的缓存
+        changed = [attr.key for attr in db.inspect(target).attrs
+                   if attr.history.has_changes()]
+        if [key for key in changed if key != 'last_seen']:
+            self.on_user_delete(mapper, connection, target)
+
+    def on_user_delete(self, mapper, connection, target):
+        ttl_cache.invalidate_on_commit(target, self, target.id)
+
+    def on_role_change(self, mapper, connection, target):
+        ttl_cache.invalidate_on_commit(target, self)
@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+
+"""邮件发送队列：固定数量的工作线程从有界队列取信，复用SMTP连接成批发送"""
+
+import atexit
+import threading
+import time
+from queue import Queue, Empty, Full
+
+STOP = object()
+
+
+class MailQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._queue = None
+        self._closed = False
+        self._atexit = False
+        self.reset_stats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.app = app
+        # 为0时在请求线程里直接发送
+        self.workers = app.config.get('FLASKY_MAIL_WORKERS', 2)
+        self.queue_size = app.config.get('FLASKY_MAIL_QUEUE_SIZE', 100)
+        # 队列满时请求线程最多等待这么久，仍然放不进去就放弃这封信
+        self.submit_timeout = app.config.get('FLASKY_MAIL_SUBMIT_TIMEOUT', 5.0)
+        # 一个连接最多连续发送的封数，以及空闲多久后关闭连接
+        self.batch_size = app.config.get('FLASKY_MAIL_BATCH_SIZE', 20)
+        self.idle_timeout = app.config.get('FLASKY_MAIL_IDLE_TIMEOUT', 1.0)
+        self._queue = Queue(self.queue_size)
+        self._closed = False
+        if self.workers > 0 and not self._atexit:
+            atexit.register(self.shutdown)
+            self._atexit = True
+
+    def reset_stats(self):
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.connections = 0
+        self.send_time = 0.0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def submit(self, msg):
+        """把邮件放进队列，返回是否成功入队；不开工作线程时返回是否发送成功"""
+        if self.workers <= 0:
+            self._count(submitted=1)
+            with self.app.app_context():
+                return self._send_batch(msg)
+        with self._lock:
+            if self._closed:
+                self.rejected += 1
+                return False
+            if not self._threads:
+                self._start()
+        try:
+            self._queue.put(msg, timeout=self.submit_timeout)
+        except Full:
+            self._count(rejected=1)
+            self.app.logger.warning('mail queue full, dropped message to %s',
+                                    ', '.join(msg.recipients))
+            return False
+        self._count(submitted=1)
+        return True
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name='mail-worker-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        with self.app.app_context():
+            while True:
+                msg = self._queue.get()
+                if msg is STOP:
+                    self._queue.task_done()
+                    return
+                if self._send_batch(msg) is STOP:
+                    return
+
+    def _next(self):
+        try:
+            return self._queue.get(timeout=self.idle_timeout)
+        except Empty:
+            return None
+
+    def _finish(self, **counts):
+        self._count(**counts)
+        if self.workers > 0:
+            self._queue.task_done()
+
+    def _send_batch(self, msg):
+        """打开一个连接，发送msg以及随后到达的邮件，直到队列空闲或达到batch_size
+
+        取到STOP时返回STOP，工作线程随之退出；否则返回这一批是否全部发出
+        """
+        from . import mail
+        ok, stop, count = True, False, 0
+        try:
+            with mail.connect() as connection:
+                self._count(connections=1)
+                while msg is not None:
+                    sent = self._send(connection, msg)
+                    msg = None
+                    if not sent:
+                        # 连接可能已经断开，后面的邮件换一个新连接
+                        ok = False
+                        break
+                    count += 1
+                    if self.workers > 0 and count < self.batch_size:
+                        msg = self._next()
+                    if msg is STOP:
+                        self._queue.task_done()
+                        msg, stop = None, True
+        except Exception:
+            # 连接失败或关闭连接时出错；没发出去的这封计为失败
+            self.app.logger.exception('failed to connect to mail server')
+            if msg is not None:
+                ok = False
+                self._finish(failed=1)
+        return STOP if stop else ok
+
+    def _send(self, connection, msg):
+        """发送一封邮件，无论成败都标记队列中的这一项已处理"""
+        start = time.perf_counter()
+        try:
+            connection.send(msg)
+        except Exception:
+            self.app.logger.exception('failed to send mail to %s',
+                                      ', '.join(msg.recipients))
+            self._count(failed=1)
+            return False
+        else:
+            self._count(sent=1, send_time=time.perf_counter() - start)
+            return True
+        finally:
+            if self.workers > 0:
+                self._queue.task_done()
+
+    def join(self):
+        """等待队列中已有的邮件全部处理完"""
+        if self._threads:
+            self._queue.join()
+
+    def shutdown(self, timeout=None):
+        """不再接收新邮件，发完队列中剩下的邮件后停止工作线程"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            self._closed = True
+        for thread in threads:
+            self._queue.put(STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self):
+        return {'workers': len(self._threads),
+                'queued': self._queue.qsize() if self._queue is not None else 0,
+                'submitted': self.submitted, 'sent': self.sent,
+                'failed': self.failed, 'rejected': self.rejected,
+                'connections': self.connections,
+                'avg_send_ms': round(self.send_time / self.sent * 1000, 2)
+                if self.sent else None}
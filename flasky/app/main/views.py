@@ -6,10 +6,14 @@ from datetime import datetime
 from flask import render_template, session, redirect, url_for, flash, jsonify, request, make_response
 from . import main
 from .forms import EditProfileForm, EditProfileAdminForm, PostForm, CommentForm, ReplyForm
-from .. import db
-from ..models import User, Role, Permission, Post, Follow, Comment, Parent_child, Zan
+from .. import db, zan_buffer, follow_graph, search_cache, username_index, render_cache, \
+    identity_cache, presence, hasher, permission_claims, mail_queue
+from ..models import User, Role, Permission, Post, Follow, Comment, Timeline
 from flask_login import login_required, current_user
 from ..decorators import admin_required, permission_required
+from ..pagination import paginate
+from ..search import search_posts
+from sqlalchemy import Integer, cast, func
 from werkzeug.utils import secure_filename
 import os
 from PIL import Image
@@ -35,11 +39,13 @@ def index():
     if current_user.is_authenticated:
         show_idols = bool(request.cookies.get('show_idols', ''))
     if show_idols:
-        query = current_user.idols_posts
+        pagination = paginate(current_user.idols_posts,
+                              [(Timeline.timestamp, True), (Timeline.post_id, True)],
+                              page, per_page=5, key=lambda post: (post.timestamp, post.id))
     else: 
-        query = Post.query 
-    pagination = query.order_by(Post.timestamp.desc()).paginate(page, per_page=5, error_out=False)
-    posts = pagination.items 
+        pagination = paginate(Post.query, [(Post.timestamp, True), (Post.id, True)],
+                              page, per_page=5)
+    posts = Post.preload(pagination.items)
     return render_template('main/index.html', posts=posts, pagination=pagination, show_idols=show_idols)
 
 @main.route('/all')
@@ -65,14 +71,22 @@ def user(username):
     if user is None:
         return render_template('main/404.html'), 404
 
+# 置顶标志是布尔列，旧数据里可能为NULL；游标里按整数比较
+POST_TOP = func.coalesce(cast(Post.top, Integer), 0)
+USER_POSTS_KEYS = [(POST_TOP, True), (Post.timestamp, True), (Post.id, True)]
+
+
+def user_posts_key(post):
+    return (int(post.top or 0), post.timestamp, post.id)
+
 @main.route('/<username>/posts/')
 @login_required
 def posts(username):
     user = User.query.filter_by(username=username).first()
     page = request.args.get('page', 1, type=int)
-    pagination = user.posts.order_by(Post.top.desc(), Post.timestamp.desc()).paginate(page, per_page=5, error_out=False)
-    posts = pagination.items
-    num = len(list(user.posts))
+    pagination = paginate(user.posts, USER_POSTS_KEYS, page, per_page=5, key=user_posts_key)
+    posts = Post.preload(pagination.items)
+    num = user.posts.count()
     return render_template('main/username_posts.html', user=user, posts=posts, pagination=pagination, num=num)
 
 @main.route('/post/<int:id>', methods=['GET', 'POST'])
@@ -80,14 +94,12 @@ def posts(username):
 def post(id):
     post = Post.query.get_or_404(id)
     page = request.args.get('page', 1, type=int)
-    if page == -1:
-        page = (post.comments.count() - 1) // 5 + 1
-    pagination = post.comments.order_by(Comment.timestamp.asc()).paginate(page, per_page=5,
-error_out=False)
+    pagination = paginate(post.comments, [(Comment.timestamp, False), (Comment.id, False)],
+                          page, per_page=5)
     comments = pagination.items
-    num = post.comments.count()
-    parent_childs = Parent_child.query.all()
-    return render_template('main/post.html', posts=[post], comments=comments, pagination=pagination, num=num, parent_childs=parent_childs)
+    num = post.comment_count
+    replies = Comment.reply_index(comments)
+    return render_template('main/post.html', posts=Post.preload([post]), comments=comments, pagination=pagination, num=num, replies=replies)
 
 @main.route('/comment/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -96,20 +108,8 @@ def comment(id):
     post = Post.query.get_or_404(id)
     form = CommentForm()
     if form.validate_on_submit():
-        comment = Comment(body=form.body.data,
-                          post=post,
-                          author=current_user._get_current_object())
-        db.session.add(comment)
+        post.add_comment(form.body.data, current_user._get_current_object(), post.id)
         db.session.commit()
-        parent_child = Parent_child(parent_id=post.id, child_id=comment.id)
-        db.session.add(parent_child)
-        db.session.commit()
-        i = post.comments.count()
-        if i > 0:
-            item = post.comments.order_by(Comment.timestamp.asc()).all()[i-1]
-            item.float_id += post.comments.count()
-            db.session.add(item)
-            db.session.commit()
         return redirect(url_for('main.post', id=post.id))
     return render_template('main/comment_form.html', form=form)
 
@@ -121,21 +121,9 @@ def commenttocomment(id):
     post = parent_comment.post
     form = CommentForm()
     if form.validate_on_submit():
-        child_comment = Comment(body=form.body.data,
-                                post=post,
-                                author=current_user._get_current_object())
-        db.session.add(child_comment)
-        db.session.commit()
-        parent_child = Parent_child(parent_id=parent_comment.id, 
-                                    child_id=child_comment.id)
-        db.session.add(parent_child)
+        post.add_comment(form.body.data, current_user._get_current_object(),
+                         parent_comment.id)
         db.session.commit()
-        i = post.comments.count()
-        if i > 0:
-            item = post.comments.order_by(Comment.timestamp.asc()).all()[i-1]
-            item.float_id += post.comments.count()
-            db.session.add(item)
-            db.session.commit()
         return redirect(url_for('main.post', id=post.id))
     return render_template('main/comment_form.html', form=form)
 
@@ -154,30 +142,9 @@ def cancelcomment(id):
 @permission_required(Permission.ZAN)
 def zanpost(id):
     post = Post.query.get_or_404(id)
-    zans = Zan.query.filter_by(post_id=post.id).all()
-    no_zan = 0
-    if zans:
-        for zan in zans:
-            if zan.author != current_user:
-                no_zan += 1
-            else:
-                no_zan += 0
-        if len(zans) == no_zan:
-            item = Zan(author=current_user._get_current_object(),
-                       status=True, 
-                       type='post',
-                       post=post)
-            db.session.add(item)
-            db.session.commit()
-        flash('您已点赞该博客')
-    else:
-        item = Zan(author=current_user._get_current_object(),
-                   status=True,
-                   type='post',
-                   post=post)
-        db.session.add(item)
-        db.session.commit()
-        flash('您已点赞该博客')
+    zan_buffer.like(current_user.id, post_id=post.id)
+    db.session.commit()
+    flash('您已点赞该博客')
     return redirect(url_for('main.post', id=post.id))
 
 @main.route('/cancelzanpost/<int:id>', methods=['GET', 'POST'])
@@ -185,11 +152,8 @@ def zanpost(id):
 @permission_required(Permission.ZAN)
 def cancelzanpost(id):
     post = Post.query.get_or_404(id)
-    zans = Zan.query.filter_by(post_id=post.id).all()
-    for zan in zans:
-        if zan.author == current_user:
-            db.session.delete(zan)
-            db.session.commit()
+    zan_buffer.unlike(current_user.id, post_id=post.id)
+    db.session.commit()
     flash('您已取消对该博客的赞')
     return redirect(url_for('main.post', id=post.id))
   
@@ -198,44 +162,56 @@ def cancelzanpost(id):
 @permission_required(Permission.ZAN)
 def zancomment(id):
     comment = Comment.query.get_or_404(id)
-    zans = Zan.query.filter_by(comment_id=comment.id).all()
-    no_zan = 0
-    if zans:
-        for zan in zans:
-            if zan.author != current_user:
-                no_zan += 1
-            else:
-                no_zan += 0
-        if len(zans) == no_zan:
-            item = Zan(author=current_user._get_current_object(),
-                       status=True, 
-                       type='comment',
-                       comment=comment)
-            db.session.add(item)
-            db.session.commit()
-        flash('您已点赞该评论')
-    else:
-        item = Zan(author=current_user._get_current_object(),
-                   status=True,
-                   type='comment',
-                   comment=comment)
-        db.session.add(item)
-        db.session.commit()
-        flash('您已点赞该评论')
-    return redirect(url_for('main.post', id=comment.post.id))
+    zan_buffer.like(current_user.id, comment_id=comment.id)
+    db.session.commit()
+    flash('您已点赞该评论')
+    return redirect(url_for('main.post', id=comment.post_id))
 
 @main.route('/cancelzancomment/<int:id>', methods=['GET', 'POST'])
 @login_required
 @permission_required(Permission.ZAN)
 def cancelzancomment(id):
     comment = Comment.query.get_or_404(id)
-    zans = Zan.query.filter_by(comment_id=comment.id).all()
-    for zan in zans:
-        if zan.author == current_user:
-            db.session.delete(zan)
-            db.session.commit()
+    zan_buffer.unlike(current_user.id, comment_id=comment.id)
+    db.session.commit()
     flash('您已取消对该评论的赞')
-    return redirect(url_for('main.post', id=comment.post.id))
+    return redirect(url_for('main.post', id=comment.post_id))
+
+@main.route('/zanpost/<int:id>/json', methods=['POST'])
+@login_required
+@permission_required(Permission.ZAN)
+def zanpost_json(id):
+    post = Post.query.get_or_404(id)
+    zan_buffer.like(current_user.id, post_id=post.id)
+    db.session.commit()
+    return jsonify({'id': post.id, 'count': post.live_zan_count, 'zanned': True})
+
+@main.route('/cancelzanpost/<int:id>/json', methods=['POST'])
+@login_required
+@permission_required(Permission.ZAN)
+def cancelzanpost_json(id):
+    post = Post.query.get_or_404(id)
+    zan_buffer.unlike(current_user.id, post_id=post.id)
+    db.session.commit()
+    return jsonify({'id': post.id, 'count': post.live_zan_count, 'zanned': False})
+
+@main.route('/zancomment/<int:id>/json', methods=['POST'])
+@login_required
+@permission_required(Permission.ZAN)
+def zancomment_json(id):
+    comment = Comment.query.get_or_404(id)
+    zan_buffer.like(current_user.id, comment_id=comment.id)
+    db.session.commit()
+    return jsonify({'id': comment.id, 'count': comment.live_zan_count, 'zanned': True})
+
+@main.route('/cancelzancomment/<int:id>/json', methods=['POST'])
+@login_required
+@permission_required(Permission.ZAN)
+def cancelzancomment_json(id):
+    comment = Comment.query.get_or_404(id)
+    zan_buffer.unlike(current_user.id, comment_id=comment.id)
+    db.session.commit()
+    return jsonify({'id': comment.id, 'count': comment.live_zan_count, 'zanned': False})
 
 @main.route('/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -332,7 +308,8 @@ def fans(username):
         flash('无效用户')
         return redirect(url_for('main.index'))
     page = request.args.get('page', 1, type=int)
-    pagination = user.followers.paginate(page, per_page=10, error_out=False)
+    pagination = paginate(user.followers, [(Follow.timestamp, False), (Follow.follower_id, False)],
+                          page, per_page=10)
     fans = [] 
     for item in pagination.items:
         fan = {'user': item.follower, 'timestamp': item.timestamp}
@@ -348,7 +325,8 @@ def idols(username):
         flash('无效用户')
         return redirect(url_for('main.index'))
     page = request.args.get('page', 1, type=int)
-    pagination = user.followed.paginate(page, per_page=10, error_out=False)
+    pagination = paginate(user.followed, [(Follow.timestamp, False), (Follow.followed_id, False)],
+                          page, per_page=10)
     idols = []
     for item in pagination.items:
         idol = {'user': item.followed, 'timestamp': item.timestamp}
@@ -362,9 +340,11 @@ def idols(username):
 @permission_required(Permission.MODERATE)
 def moderate():
     page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(page, per_page=10, error_out=False)
+    pagination = paginate(Comment.query, [(Comment.timestamp, True), (Comment.id, True)],
+                          page, per_page=10)
     comments = pagination.items
-    return render_template('main/moderate.html', comments=comments, pagination=pagination, page=page)
+    replies = Comment.reply_index(comments)
+    return render_template('main/moderate.html', comments=comments, pagination=pagination, page=page, replies=replies)
 
 @main.route('/moderate/enable/<int:id>')
 @login_required
@@ -471,21 +451,40 @@ def download(filename):
 @main.route('/search', methods=['GET', 'POST'])
 @login_required
 def search():
-    if request.method == 'POST':
-        keywords = request.form['searchwords']
-        posts = Post.query.order_by(Post.timestamp.desc()).all()
-        results = []
-        for post in posts:
-            if keywords in post.body:
-               results.append(post)
-        if len(results) == 0:
+    keywords = request.values.get('searchwords', '').strip()
+    if keywords:
+        page = request.args.get('page', 1, type=int)
+        pagination = search_posts(keywords, page, per_page=10)
+        if pagination.total == 0:
             status = "error"
         else:
             status = "success"
-        counts = len(results)
-        return render_template('main/search_results.html', keywords=keywords, results=results, status=status, counts=counts)
+        return render_template('main/search_results.html', keywords=keywords, results=pagination.items, status=status, counts=pagination.total, pagination=pagination)
     return render_template('main/search.html')
 
+@main.route('/users/autocomplete')
+@login_required
+def user_autocomplete():
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({'users': [{'id': id, 'username': username,
+                               'url': url_for('main.user', username=username)}
+                              for id, username in username_index.complete(prefix, limit)]})
+
+@main.route('/admin/stats')
+@login_required
+@admin_required
+def stats():
+    return jsonify({'search_cache': search_cache.stats(),
+                    'follow_graph': follow_graph.stats(),
+                    'username_index': username_index.stats(),
+                    'render_cache': render_cache.stats(),
+                    'identity_cache': identity_cache.stats(),
+                    'presence': presence.stats(),
+                    'password_hashing': hasher.stats(),
+                    'permission_claims': permission_claims.stats(),
+                    'mail_queue': mail_queue.stats()})
+
 @main.route('/video')
 def video():
     return render_template('main/video.html')
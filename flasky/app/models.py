@@ -2,22 +2,30 @@
 
 
 
-from . import db, login_manager 
-from werkzeug.security import generate_password_hash, check_password_hash 
+from . import db, login_manager, zan_buffer, follow_graph, search, username_index, \
+    identity_cache, presence, hasher, permission_claims
 from flask_login import UserMixin 
 from flask_login import AnonymousUserMixin
-from itsdangerous import TimedJSONWebSignatureSerializer as Serializer 
 from flask import current_app, request
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime
 import hashlib
-from markdown import markdown
-import bleach
+from .render import render_into
+from . import tokens
+from . import ttl_cache
 
 
+def adjust_counter(connection, model, column, id, delta):
+    # 计数列原地加减，不读出再写回
+    if id is not None:
+        connection.execute(model.__table__.update().where(
+            model.id == id).values({column: column + delta}))
+
 from . import login_manager
 @login_manager.user_loader 
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.load(int(user_id))
 
 
 class Permission:
@@ -35,6 +43,7 @@ class Role(db.Model):
     name = db.Column(db.String(64), unique=True)
     default = db.Column(db.Boolean, default=False, index=True)
     permissions = db.Column(db.Integer)
+    version = db.Column(db.Integer, default=0)
     users = db.relationship('User', backref='role', lazy='dynamic')
 
     def __init__(self, **kwargs):
@@ -55,9 +64,35 @@ class Role(db.Model):
 
     def has_permission(self, perm):
         return self.permissions & perm == perm
+
+    @staticmethod
+    def next_version(connection):
+        # 取所有角色中最大的版本号加一，最大版本号因而能反映任何一次变化
+        return (connection.scalar(db.select([db.func.max(Role.version)])) or 0) + 1
+
+    @staticmethod
+    def on_update(mapper, connection, target):
+        # 权限变化时更新版本号，会话中的权限声明随之失效
+        if db.inspect(target).attrs.permissions.history.has_changes():
+            target.version = Role.next_version(connection)
+
+    @staticmethod
+    def on_user_role_change(mapper, connection, target):
+        # 用户换了角色（包括去掉角色）时更新版本号，该用户的旧声明随之失效
+        attrs = db.inspect(target).attrs
+        if not (attrs.role.history.has_changes() or attrs.role_id.history.has_changes()):
+            return
+        # 版本号取所有角色的最大值，更新哪个角色都行；去掉角色时没有新角色可改，改旧角色
+        old = [r.id for r in attrs.role.history.deleted if r is not None] + \
+            [i for i in attrs.role_id.history.deleted if i is not None]
+        role_id = target.role_id if target.role_id is not None else next(iter(old), None)
+        if role_id is None:
+            role_id = connection.scalar(db.select([db.func.min(Role.id)]))
+        connection.execute(Role.__table__.update().where(
+            Role.id == role_id).values(version=Role.next_version(connection)))
     
     @staticmethod
-        def insert_roles(): 
+    def insert_roles(): 
         roles = {
             'User': [Permission.FOLLOW, Permission.COMMENT, Permission.ZAN, Permission.WRITE],
             'Moderator': [Permission.FOLLOW, Permission.COMMENT, Permission.ZAN, Permission.WRITE, Permission.MODERATE],
@@ -90,6 +125,25 @@ class Follow(db.Model):
     followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @staticmethod
+    def on_insert(mapper, connection, target):
+        adjust_counter(connection, User, User.followed_count, target.follower_id, 1)
+        adjust_counter(connection, User, User.followers_count, target.followed_id, 1)
+        Follow.invalidate_graph(target)
+
+    @staticmethod
+    def on_delete(mapper, connection, target):
+        adjust_counter(connection, User, User.followed_count, target.follower_id, -1)
+        adjust_counter(connection, User, User.followers_count, target.followed_id, -1)
+        Follow.invalidate_graph(target)
+
+    @staticmethod
+    def invalidate_graph(target):
+        user_ids = (target.follower_id, target.followed_id)
+        ttl_cache.invalidate_on_commit(target, follow_graph, *user_ids)
+        # 关注数是直接UPDATE的计数列，缓存的用户也要失效
+        ttl_cache.invalidate_on_commit(target, identity_cache, *user_ids)
+
 class User(db.Model, UserMixin):
     __tablename__='users' 
     id = db.Column(db.Integer, primary_key=True)
@@ -107,6 +161,8 @@ class User(db.Model, UserMixin):
     avatar_hash_2 = db.Column(db.String(64))
     login_count = db.Column(db.Integer, default=0)
     last_login_ip = db.Column(db.String(128), default='unknown')
+    followed_count = db.Column(db.Integer, default=0)
+    followers_count = db.Column(db.Integer, default=0)
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     followed = db.relationship('Follow',
                                foreign_keys=[Follow.follower_id],
@@ -123,7 +179,16 @@ class User(db.Model, UserMixin):
     
     @property
     def idols_posts(self):
-        return Post.query.join(Follow, Follow.followed_id == Post.author_id).filter(Follow.follower_id == self.id)
+        return Post.query.join(Timeline, Timeline.post_id == Post.id).filter(Timeline.user_id == self.id)
+
+    @staticmethod
+    def recount():
+        followed = db.select([db.func.count()]).where(Follow.follower_id == User.id).as_scalar()
+        followers = db.select([db.func.count()]).where(Follow.followed_id == User.id).as_scalar()
+        return db.session.execute(User.__table__.update().where(db.or_(
+            db.func.coalesce(User.followed_count, -1) != followed,
+            db.func.coalesce(User.followers_count, -1) != followers)).values(
+            followed_count=followed, followers_count=followers)).rowcount
 
     @staticmethod
     def add_self_idols():
@@ -133,9 +198,12 @@ class User(db.Model, UserMixin):
             db.session.commit()
    
     def ping(self):
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
-        db.session.commit()
+        presence.touch(self)
+
+    @property
+    def live_last_seen(self):
+        # 内存中尚未写库的访问时间更新
+        return presence.last_seen(self.id) or self.last_seen
 
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
@@ -163,37 +231,36 @@ class User(db.Model, UserMixin):
     
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not hasher.verify(self.password_hash, password):
+            return False
+        if hasher.needs_rehash(self.password_hash):
+            # 散列参数已调整，用刚验证过的明文重新散列，由调用方提交
+            self.password = password
+            hasher.note_rehash()
+            db.session.add(self)
+        return True
 
     def generate_confirmation_token(self, expiration=3600):
-        s = Serializer(current_app.config['SECRET_KEY'], expiration)
-        return s.dumps({ 'confirm': self.id }).decode('utf-8')
+        return tokens.generate('confirm', {'confirm': self.id}, expiration)
 
     def confirm(self, token):
-        s = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token.encode('utf-8'))
-        except:
-            return False
-        if data.get('confirm') != self.id:
+        data = tokens.load('confirm', token)
+        if data is None or data.get('confirm') != self.id:
             return False
         self.confirmed = True
         db.session.add(self)
         return True
 
     def generate_reset_token(self, expiration=3600):
-        s = Serializer(current_app.config['SECRET_KEY'], expiration)
-        return s.dumps({'reset': self.id}).decode('utf-8')
+        return tokens.generate('reset', {'reset': self.id}, expiration)
 
     @staticmethod 
     def reset_password(token, new_password):
-        s = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token.encode('utf-8'))
-        except:
+        data = tokens.load('reset', token)
+        if data is None or not isinstance(data.get('reset'), int):
             return False
         user = User.query.get(data.get('reset'))
         if user is None:
@@ -203,17 +270,12 @@ class User(db.Model, UserMixin):
         return True
 
     def generate_email_change_token(self, new_email, expiration=3600):
-        s = Serializer(current_app.config['SECRET_KEY'], expiration)
-        return s.dumps(
-            {'change_email': self.id, 'new_email': new_email}).decode('utf-8')
+        return tokens.generate(
+            'change_email', {'change_email': self.id, 'new_email': new_email}, expiration)
 
     def change_email(self, token):
-        s = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token.encode('utf-8'))
-        except:
-            return False
-        if data.get('change_email') != self.id:
+        data = tokens.load('change_email', token)
+        if data is None or data.get('change_email') != self.id:
             return False
         new_email = data.get('new_email')
         if new_email is None:
@@ -227,7 +289,9 @@ class User(db.Model, UserMixin):
         return True
    
     def follow(self, user):
-        if not self.is_following(user):
+        # 缓存可能过期，写入前以数据库为准；缓存只用于页面展示
+        if user.id is None or self.id is None or \
+                self.followed.filter_by(followed_id=user.id).first() is None:
             f = Follow(follower=self, followed=user)
             db.session.add(f)
 
@@ -237,16 +301,14 @@ class User(db.Model, UserMixin):
             db.session.delete(f)
 
     def is_following(self, user):
-        if user.id is None:
+        if user.id is None or self.id is None:
             return False
-        return self.followed.filter_by(
-            followed_id=user.id).first() is not None
+        return follow_graph.is_following(self.id, user.id)
 
     def is_followed_by(self, user):
-        if user.id is None:
+        if user.id is None or self.id is None:
             return False
-        return self.followers.filter_by(
-            follower_id=user.id).first() is not None
+        return follow_graph.is_following(user.id, self.id)
 
 class AnonymousUser(AnonymousUserMixin):
     def can(self, permissions):
@@ -264,19 +326,121 @@ class Post(db.Model):
     body = db.Column(db.Text)
     
     body_html = db.Column(db.Text)
+    body_html_version = db.Column(db.Integer, index=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id')) 
     top = db.Column(db.Boolean, default=False, index=True)
     comments = db.relationship('Comment', backref='post', lazy='dynamic') 
     zans = db.relationship('Zan', backref='post', lazy='dynamic')
+    zan_count = db.Column(db.Integer, default=0)
+    comment_count = db.Column(db.Integer, default=0)
+    floor_seq = db.Column(db.Integer, default=0)
+
+    @property
+    def live_zan_count(self):
+        return (self.zan_count or 0) + zan_buffer.delta('post', self.id)
+
+    def next_floor(self):
+        # UPDATE先拿到写锁，再在同一事务里读回楼层号，并发回复不会重号
+        db.session.execute(Post.__table__.update().where(Post.id == self.id).values(
+            floor_seq=db.func.coalesce(Post.floor_seq, 0) + 1))
+        return db.session.execute(db.select([Post.floor_seq]).where(
+            Post.id == self.id)).scalar()
+
+    def add_comment(self, body, author, parent_id):
+        comment = Comment(body=body, post=self, author=author,
+                          float_id=self.next_floor())
+        db.session.add(comment)
+        db.session.add(Parent_child(parent_id=parent_id, child=comment))
+        return comment
+
+    @staticmethod
+    def preload(posts):
+        # 一页文章的作者用一条查询取回，点赞数直接读计数列
+        if not posts:
+            return posts
+        authors = dict((user.id, user) for user in User.query.filter(
+            User.id.in_(set(post.author_id for post in posts))))
+        for post in posts:
+            set_committed_value(post, 'author', authors.get(post.author_id))
+        return posts
+
+    @staticmethod
+    def recount():
+        zans = db.select([db.func.count()]).where(Zan.post_id == Post.id).as_scalar()
+        comments = db.select([db.func.count()]).where(Comment.post_id == Post.id).as_scalar()
+        return db.session.execute(Post.__table__.update().where(db.or_(
+            db.func.coalesce(Post.zan_count, -1) != zans,
+            db.func.coalesce(Post.comment_count, -1) != comments)).values(
+            zan_count=zans, comment_count=comments)).rowcount
+
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
-                        'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
-                        'h1', 'h2', 'h3', 'p']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))  
+        render_into(target, value, 'post')
+
+
+class Timeline(db.Model):
+    __tablename__ = 'timelines'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime)
+    __table_args__ = (db.Index('ix_timelines_user_id_timestamp', 'user_id', 'timestamp'),)
+
+    @staticmethod
+    def _missing(user_id, post_id):
+        return ~db.exists().where(db.and_(Timeline.user_id == user_id,
+                                          Timeline.post_id == post_id))
+
+    @staticmethod
+    def on_post_insert(mapper, connection, target):
+        # 写扩散：新文章写入所有粉丝的时间线
+        rows = db.select([Follow.follower_id,
+                          db.literal(target.id),
+                          db.literal(target.timestamp, db.DateTime)]).where(
+            db.and_(Follow.followed_id == target.author_id,
+                    Timeline._missing(Follow.follower_id, target.id)))
+        connection.execute(Timeline.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'], rows))
+
+    @staticmethod
+    def on_post_delete(mapper, connection, target):
+        connection.execute(Timeline.__table__.delete().where(
+            Timeline.post_id == target.id))
+
+    @staticmethod
+    def on_follow_insert(mapper, connection, target):
+        # 关注时回填被关注者的历史文章
+        rows = db.select([db.literal(target.follower_id),
+                          Post.id,
+                          Post.timestamp]).where(
+            db.and_(Post.author_id == target.followed_id,
+                    Timeline._missing(target.follower_id, Post.id)))
+        connection.execute(Timeline.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'], rows))
+
+    @staticmethod
+    def on_follow_delete(mapper, connection, target):
+        # 取消关注时删除被关注者的文章
+        posts = db.select([Post.id]).where(Post.author_id == target.followed_id)
+        connection.execute(Timeline.__table__.delete().where(
+            db.and_(Timeline.user_id == target.follower_id,
+                    Timeline.post_id.in_(posts))))
+
+    @staticmethod
+    def rebuild():
+        db.session.execute(Timeline.__table__.delete())
+        rows = db.select([Follow.follower_id, Post.id, Post.timestamp]).where(
+            Follow.followed_id == Post.author_id)
+        db.session.execute(Timeline.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'], rows))
+        db.session.commit()
+        return Timeline.query.count()
+
+search.register(Post)
+db.event.listen(Post, 'after_insert', Timeline.on_post_insert)
+db.event.listen(Post, 'before_delete', Timeline.on_post_delete)
+db.event.listen(Follow, 'after_insert', Timeline.on_follow_insert)
+db.event.listen(Follow, 'after_delete', Timeline.on_follow_delete)
 
 class Parent_child(db.Model):
     __tablename__ = 'parent_child'
@@ -289,6 +453,7 @@ class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.Text)
     body_html = db.Column(db.Text)
+    body_html_version = db.Column(db.Integer, index=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     disabled = db.Column(db.Boolean)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -305,23 +470,61 @@ class Comment(db.Model):
                              cascade='all, delete-orphan')
     float_id = db.Column(db.Integer, default='0')
     zans = db.relationship('Zan', backref='comment', lazy='dynamic')
-    def relayedname(self, parent_childs):
-        for parent_child in parent_childs:
-            if parent_child.parent_id == self.post_id and parent_child.child_id == self.id:
-                return self.post.author.username
-            if parent_child.parent_id != self.post_id and parent_child.child_id == self.id:
-                for item in self.post.comments:
-                    if parent_child.parent_id == item.id:
-                        return item.author.username
+    zan_count = db.Column(db.Integer, default=0)
+
+    @property
+    def live_zan_count(self):
+        return (self.zan_count or 0) + zan_buffer.delta('comment', self.id)
+
+    @staticmethod
+    def recount():
+        zans = db.select([db.func.count()]).where(Zan.comment_id == Comment.id).as_scalar()
+        return db.session.execute(Comment.__table__.update().where(
+            db.func.coalesce(Comment.zan_count, -1) != zans).values(
+            zan_count=zans)).rowcount
+
+    @staticmethod
+    def on_insert(mapper, connection, target):
+        adjust_counter(connection, Post, Post.comment_count, target.post_id, 1)
+
+    @staticmethod
+    def on_delete(mapper, connection, target):
+        adjust_counter(connection, Post, Post.comment_count, target.post_id, -1)
+    @staticmethod
+    def reply_index(comments):
+        # 评论id -> 被回复者的用户名；parent_id等于post_id时回复的是文章作者
+        ids = [comment.id for comment in comments]
+        if not ids:
+            return {}
+        child = db.aliased(Comment)
+        parent = db.aliased(Comment)
+        post_author = db.aliased(User)
+        parent_author = db.aliased(User)
+        rows = db.session.query(Parent_child.child_id, Parent_child.parent_id,
+                                child.post_id, post_author.username,
+                                parent_author.username) \
+            .join(child, child.id == Parent_child.child_id) \
+            .join(Post, Post.id == child.post_id) \
+            .join(post_author, post_author.id == Post.author_id) \
+            .outerjoin(parent, db.and_(parent.id == Parent_child.parent_id,
+                                       parent.post_id == child.post_id)) \
+            .outerjoin(parent_author, parent_author.id == parent.author_id) \
+            .filter(Parent_child.child_id.in_(ids))
+        replies = {}
+        for child_id, parent_id, post_id, post_username, parent_username in rows:
+            if child_id in replies:
+                continue
+            if parent_id == post_id:
+                replies[child_id] = post_username
+            elif parent_username is not None:
+                replies[child_id] = parent_username
+        return replies
           
     @staticmethod
     def on_changed_body(target, value, oldvalue, initiator):
-        allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i',
-                        'strong']
-        target.body_html = bleach.linkify(bleach.clean(
-            markdown(value, output_format='html'),
-            tags=allowed_tags, strip=True))
+        render_into(target, value, 'comment')
   
+db.event.listen(Post.body, 'set', Post.on_changed_body)
 db.event.listen(Comment.body, 'set', Comment.on_changed_body)
 
 class Zan(db.Model):
@@ -333,4 +536,59 @@ class Zan(db.Model):
     type = db.Column(db.String(64), index=True)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'))
     comment_id = db.Column(db.Integer, db.ForeignKey('comments.id'))
+    __table_args__ = (
+        db.UniqueConstraint('author_id', 'post_id', name='uq_zans_author_post'),
+        db.UniqueConstraint('author_id', 'comment_id', name='uq_zans_author_comment'),
+    )
 
+    @staticmethod
+    def like(author_id, post_id=None, comment_id=None, connection=None):
+        # 单条INSERT，已经赞过的由唯一约束忽略；返回是否新增
+        connection = connection or db.session
+        stmt = Zan.__table__.insert().prefix_with('OR IGNORE', dialect='sqlite') \
+            .prefix_with('IGNORE', dialect='mysql').values(
+                timestamp=datetime.utcnow(), author_id=author_id, status=True,
+                type='post' if post_id is not None else 'comment',
+                post_id=post_id, comment_id=comment_id)
+        added = connection.execute(stmt).rowcount
+        if added:
+            adjust_counter(connection, Post, Post.zan_count, post_id, added)
+            adjust_counter(connection, Comment, Comment.zan_count, comment_id, added)
+        return added > 0
+
+    @staticmethod
+    def unlike(author_id, post_id=None, comment_id=None, connection=None):
+        connection = connection or db.session
+        if post_id is not None:
+            target = Zan.post_id == post_id
+        else:
+            target = Zan.comment_id == comment_id
+        removed = connection.execute(Zan.__table__.delete().where(
+            db.and_(Zan.author_id == author_id, target))).rowcount
+        if removed:
+            adjust_counter(connection, Post, Post.zan_count, post_id, -removed)
+            adjust_counter(connection, Comment, Comment.zan_count, comment_id, -removed)
+        return removed > 0
+
+    @staticmethod
+    def on_insert(mapper, connection, target):
+        adjust_counter(connection, Post, Post.zan_count, target.post_id, 1)
+        adjust_counter(connection, Comment, Comment.zan_count, target.comment_id, 1)
+
+    @staticmethod
+    def on_delete(mapper, connection, target):
+        adjust_counter(connection, Post, Post.zan_count, target.post_id, -1)
+        adjust_counter(connection, Comment, Comment.zan_count, target.comment_id, -1)
+
+db.event.listen(Follow, 'after_insert', Follow.on_insert)
+db.event.listen(Follow, 'after_delete', Follow.on_delete)
+ttl_cache.register()
+db.event.listen(Comment, 'after_insert', Comment.on_insert)
+db.event.listen(Comment, 'after_delete', Comment.on_delete)
+db.event.listen(Zan, 'after_insert', Zan.on_insert)
+db.event.listen(Zan, 'after_delete', Zan.on_delete)
+username_index.register(User)
+identity_cache.register(User, Role)
+db.event.listen(Role, 'before_update', Role.on_update)
+db.event.listen(User, 'after_update', Role.on_user_role_change)
+permission_claims.register(User, Role)
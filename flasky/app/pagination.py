@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+
+"""游标(keyset)分页：按排序键定位，不用OFFSET，也不计算总数"""
+
+import base64
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_
+
+
+class KeysetPagination:
+    keyset = True
+
+    def __init__(self, items, keys, per_page, has_prev, has_next, key=None):
+        self.items = items
+        self.keys = keys
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.key = key or (lambda item: tuple(getattr(item, column.key)
+                                              for column, desc in keys))
+
+    @property
+    def prev_cursor(self):
+        if self.has_prev and self.items:
+            return encode_cursor(self.key(self.items[0]))
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self.key(self.items[-1]))
+
+
+def encode_cursor(values):
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append('n:')
+        elif isinstance(value, bool):
+            parts.append('b:%d' % value)
+        elif isinstance(value, datetime):
+            parts.append('d:' + value.isoformat())
+        else:
+            parts.append('i:%d' % value)
+    raw = '|'.join(parts).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        parts = raw.decode('utf-8').split('|')
+        if len(parts) != size:
+            return None
+        values = []
+        for part in parts:
+            kind, value = part.split(':', 1)
+            if kind == 'n':
+                values.append(None)
+            elif kind == 'b':
+                values.append(value == '1')
+            elif kind == 'd':
+                fmt = '%Y-%m-%dT%H:%M:%S.%f' if '.' in value else '%Y-%m-%dT%H:%M:%S'
+                values.append(datetime.strptime(value, fmt))
+            elif kind == 'i':
+                values.append(int(value))
+            else:
+                return None
+        return values
+    except (ValueError, TypeError):
+        return None
+
+
+def _orderings(keys, reverse=False):
+    return [column.desc() if desc != reverse else column.asc()
+            for column, desc in keys]
+
+
+def _seek(keys, values, reverse=False):
+    # (a, b) 之后 == a > x OR (a = x AND b > y)，降序的列方向相反
+    clauses = []
+    for i, (column, desc) in enumerate(keys):
+        if desc != reverse:
+            step = column < values[i]
+        else:
+            step = column > values[i]
+        clauses.append(and_(*([keys[j][0] == values[j] for j in range(i)] + [step])))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, keys, per_page, after=None, before=None,
+                    last=False, key=None):
+    """keys为[(列, 是否降序), ...]，最后一列须能唯一确定一行"""
+    after = decode_cursor(after, len(keys)) if after else None
+    before = decode_cursor(before, len(keys)) if before else None
+    if after is not None:
+        rows = query.filter(_seek(keys, after)).order_by(
+            *_orderings(keys)).limit(per_page + 1).all()
+        return KeysetPagination(rows[:per_page], keys, per_page,
+                                True, len(rows) > per_page, key)
+    if before is not None or last:
+        if before is not None:
+            query = query.filter(_seek(keys, before, reverse=True))
+        rows = query.order_by(*_orderings(keys, reverse=True)).limit(
+            per_page + 1).all()
+        items = rows[:per_page][::-1]
+        return KeysetPagination(items, keys, per_page,
+                                len(rows) > per_page, before is not None, key)
+    rows = query.order_by(*_orderings(keys)).limit(per_page + 1).all()
+    return KeysetPagination(rows[:per_page], keys, per_page,
+                            False, len(rows) > per_page, key)
+
+
+def paginate(query, keys, page, per_page, key=None):
+    """按配置选择OFFSET分页或游标分页"""
+    if current_app.config.get('FLASKY_KEYSET_PAGINATION'):
+        return keyset_paginate(query, keys, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'),
+                               last=page == -1, key=key)
+    if page == -1:
+        page = (query.count() - 1) // per_page + 1
+    return query.order_by(*_orderings(keys)).paginate(
+        page, per_page=per_page, error_out=False)
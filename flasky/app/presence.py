@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+
+"""在线状态跟踪：last_seen先记在内存里，按时间批量写库，不在每个请求里提交"""
+
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+
+class PresenceTracker:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._seen = {}      # user_id -> [最近访问时间, 库中的last_seen]
+        self._pending = set()  # 与库中相差超过drift、需要写库的用户
+        self._timer = None
+        self._atexit = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('FLASKY_PRESENCE_TRACKING', True)
+        self.flush_interval = app.config.get('FLASKY_PRESENCE_FLUSH_INTERVAL', 60)
+        # 库中的值落后不到drift秒时不写库，只在内存里覆盖显示
+        self.drift = timedelta(seconds=app.config.get('FLASKY_PRESENCE_DRIFT', 300))
+        self.flush_size = app.config.get('FLASKY_PRESENCE_FLUSH_SIZE', 500)
+        if self.enabled and not self._atexit:
+            atexit.register(self.flush)
+            self._atexit = True
+
+    def touch(self, user):
+        from . import db
+        now = datetime.utcnow()
+        if not self.enabled:
+            user.last_seen = now
+            db.session.add(user)
+            db.session.commit()
+            return
+        with self._lock:
+            entry = self._seen.get(user.id)
+            if entry is None:
+                entry = self._seen[user.id] = [now, user.last_seen]
+            entry[0] = now
+            if entry[1] is None or now - entry[1] >= self.drift:
+                self._pending.add(user.id)
+            full = len(self._pending) >= self.flush_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def last_seen(self, user_id):
+        """内存中的最近访问时间，没有则返回None"""
+        entry = self._seen.get(user_id)
+        return entry[0] if entry is not None else None
+
+    def flush(self):
+        """写入落后超过drift的用户，以及一个周期内没再访问的用户(随后从内存移除)"""
+        from .models import User
+        from . import db
+        now = datetime.utcnow()
+        idle = timedelta(seconds=self.flush_interval)
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            writes = dict((user_id, entry[0]) for user_id, entry in self._seen.items()
+                          if user_id in self._pending or
+                          (now - entry[0] >= idle and entry[0] != entry[1]))
+            self._pending = set()
+        if writes:
+            table = User.__table__
+            try:
+                with db.get_engine(self.app).begin() as connection:
+                    connection.execute(table.update().where(
+                        table.c.id == db.bindparam('_id')).values(
+                            last_seen=db.bindparam('_seen')),
+                        [{'_id': user_id, '_seen': seen}
+                         for user_id, seen in writes.items()])
+            except Exception:
+                with self._lock:
+                    self._pending.update(writes)
+                raise
+        with self._lock:
+            for user_id, seen in writes.items():
+                entry = self._seen.get(user_id)
+                if entry is not None:
+                    entry[1] = seen
+            for user_id, entry in list(self._seen.items()):
+                if now - entry[0] >= idle and entry[0] == entry[1]:
+                    del self._seen[user_id]
+            if self._seen and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return len(writes)
+
+    def stats(self):
+        return {'users': len(self._seen), 'pending': len(self._pending)}
@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+
+"""Markdown渲染管线：写入时把正文渲染成净化过的HTML，文章和评论共用"""
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import hashlib
+import threading
+import time
+from bleach.linkifier import Linker
+from bleach.sanitizer import Cleaner
+from markdown import Markdown
+from sqlalchemy import bindparam, or_, select
+
+# 修改标签白名单或渲染方式时加一，body_html_version较小的行需要重新渲染
+RENDERER_VERSION = 1
+
+PROFILES = {
+    'post': ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
+             'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
+             'h1', 'h2', 'h3', 'p'],
+    'comment': ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i',
+                'strong'],
+}
+
+
+class RenderEngine:
+    """可重复使用的Markdown解析器和净化器，创建开销只在每个线程付一次
+
+    这些对象不是线程安全的，通过engine()按线程取用
+    """
+    def __init__(self):
+        self.markdown = Markdown(output_format='html')
+        self.cleaners = dict((profile, Cleaner(tags=tags, strip=True))
+                             for profile, tags in PROFILES.items())
+        self.linker = Linker()
+
+    def render(self, body, profile):
+        html = self.markdown.reset().convert(body or '')
+        return self.linker.linkify(self.cleaners[profile].clean(html))
+
+
+_local = threading.local()
+
+
+def engine():
+    if not hasattr(_local, 'engine'):
+        _local.engine = RenderEngine()
+    return _local.engine
+
+
+def render(body, profile):
+    """返回body按profile白名单渲染出的HTML"""
+    return engine().render(body, profile)
+
+
+class RenderCache:
+    """按(正文哈希, 白名单, 渲染器版本)缓存渲染结果，相同正文只渲染一次"""
+    def __init__(self, app=None, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0.0  # 命中省下的渲染耗时，按该条首次渲染的耗时累计
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (HTML, 渲染耗时)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('FLASKY_RENDER_CACHE_SIZE', 10000)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def render(self, body, profile):
+        body = body or ''
+        key = (hashlib.sha1(body.encode('utf-8')).digest(), profile, RENDERER_VERSION)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved += entry[1]
+                return entry[0]
+            self.misses += 1
+        start = time.perf_counter()
+        html = render(body, profile)
+        cost = time.perf_counter() - start
+        with self._lock:
+            if self.max_entries > 0:
+                self._entries[key] = (html, cost)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return html
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'saved_seconds': round(self.saved, 4)}
+
+
+# 进程池中的渲染进程各自使用一个缓存
+worker_cache = RenderCache()
+
+
+def render_into(target, body, profile):
+    from . import render_cache
+    target.body_html = render_cache.render(body, profile)
+    target.body_html_version = RENDERER_VERSION
+
+
+def render_rows(profile, rows):
+    """进程池任务：渲染一批(id, 正文)，返回(id, HTML)"""
+    return [(id, worker_cache.render(body, profile)) for id, body in rows]
+
+
+class InlineExecutor:
+    """不开进程，直接在当前进程渲染，接口与进程池一致"""
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def rerender(connection, table, profile, executor, chunk_size=500,
+             after=0, force=False, in_flight=4):
+    """按id顺序分块重新渲染table中过期的body_html
+
+    读取、渲染、写回流水线进行，每写回一块提交一次并产出(该块最大id, 行数)，
+    调用方据此保存断点；force为真时不论版本全部重新渲染
+    """
+    query = select([table.c.id, table.c.body]).order_by(table.c.id).limit(chunk_size)
+    if not force:
+        query = query.where(or_(table.c.body_html_version.is_(None),
+                                table.c.body_html_version < RENDERER_VERSION))
+    update = table.update().where(table.c.id == bindparam('_id')).values(
+        body_html=bindparam('_html'), body_html_version=RENDERER_VERSION)
+    pending = deque()
+    last_id = after
+    while True:
+        rows = connection.execute(query.where(table.c.id > last_id)).fetchall()
+        if rows:
+            last_id = rows[-1][0]
+            pending.append(executor.submit(render_rows, profile,
+                                           [tuple(row) for row in rows]))
+        if pending and (not rows or len(pending) >= in_flight):
+            results = pending.popleft().result()
+            with connection.begin():
+                connection.execute(update, [{'_id': id, '_html': html}
+                                            for id, html in results])
+            yield results[-1][0], len(results)
+        if not rows and not pending:
+            return
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+
+"""文章全文检索：SQLite下使用FTS5索引，其他数据库退回LIKE查询"""
+
+from flask import current_app, Markup, escape
+from flask_sqlalchemy import Pagination
+from sqlalchemy import DDL, text
+from . import db, search_cache, ttl_cache
+from .tokenizers import TOKENIZERS
+
+FTS_TABLE = 'post_search'
+# 摘要里的高亮标记，用私有区字符，不会和正文冲突
+MARK_START, MARK_END = '\ue000', '\ue001'
+SNIPPET_TOKENS = 40
+
+
+def is_fts(connection):
+    return connection.dialect.name == 'sqlite'
+
+
+def get_tokenizer():
+    return TOKENIZERS[current_app.config.get('FLASKY_SEARCH_TOKENIZER', 'bigram')]
+
+
+def on_post_insert(mapper, connection, target):
+    ttl_cache.invalidate_on_commit(target, search_cache)
+    if is_fts(connection):
+        connection.execute(text('INSERT INTO post_search (rowid, body) '
+                                'VALUES (:id, :body)'),
+                           id=target.id, body=get_tokenizer().index_text(target.body))
+
+
+def on_post_update(mapper, connection, target):
+    if not db.inspect(target).attrs.body.history.has_changes():
+        return
+    if is_fts(connection):
+        connection.execute(text('DELETE FROM post_search WHERE rowid = :id'),
+                           id=target.id)
+    on_post_insert(mapper, connection, target)
+
+
+def on_post_delete(mapper, connection, target):
+    ttl_cache.invalidate_on_commit(target, search_cache)
+    if is_fts(connection):
+        connection.execute(text('DELETE FROM post_search WHERE rowid = :id'),
+                           id=target.id)
+
+
+def register(post_model):
+    table = post_model.__table__
+    db.event.listen(table, 'after_create', DDL(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5(body)'
+    ).execute_if(dialect='sqlite'))
+    db.event.listen(table, 'before_drop', DDL(
+        'DROP TABLE IF EXISTS post_search').execute_if(dialect='sqlite'))
+    db.event.listen(post_model, 'after_insert', on_post_insert)
+    db.event.listen(post_model, 'after_update', on_post_update)
+    db.event.listen(post_model, 'after_delete', on_post_delete)
+    ttl_cache.register()
+
+
+def rebuild_index(connection, chunk_size=1000):
+    """用当前分词器重建索引，更换分词器后需要执行"""
+    from .models import Post
+    if not is_fts(connection):
+        return 0
+    tokenizer = get_tokenizer()
+    search_cache.invalidate()
+    connection.execute(text('DELETE FROM post_search'))
+    last_id, count = 0, 0
+    while True:
+        rows = connection.execute(db.select([Post.id, Post.body]).where(
+            Post.id > last_id).order_by(Post.id).limit(chunk_size)).fetchall()
+        if not rows:
+            return count
+        connection.execute(text('INSERT INTO post_search (rowid, body) '
+                                'VALUES (:id, :body)'),
+                           [{'id': id, 'body': tokenizer.index_text(body)}
+                            for id, body in rows])
+        last_id, count = rows[-1][0], count + len(rows)
+
+
+def match_query(keywords):
+    # 每个关键词经分词后作为一个短语，彼此之间是AND；分词结果只含字母数字，不会破坏MATCH语法
+    tokenizer = get_tokenizer()
+    phrases = [tokenizer.query_phrase(term) for term in keywords.split()]
+    return ' '.join(phrase for phrase in phrases if phrase)
+
+
+def highlight(segments):
+    return Markup('').join(Markup('<mark>%s</mark>') % text if marked else escape(text)
+                           for text, marked in segments)
+
+
+def excerpt(body, length=80):
+    body = body or ''
+    return escape(body[:length] + ('…' if len(body) > length else ''))
+
+
+def ranked_ids(query, keywords):
+    """按相关度排好序的全部命中id"""
+    from .models import Post
+    if is_fts(db.session.connection()):
+        return [row[0] for row in db.session.execute(text(
+            'SELECT rowid FROM post_search WHERE post_search MATCH :q ORDER BY rank'),
+            {'q': query})]
+    return [row[0] for row in Post.query.filter(db.and_(
+        *[Post.body.contains(term) for term in keywords.split()])).with_entities(
+            Post.id).order_by(Post.timestamp.desc())]
+
+
+def snippets(query, keywords, ids):
+    """只为当前页的id生成摘要，高亮只落在keywords上"""
+    from .models import Post
+    if is_fts(db.session.connection()):
+        tokenizer = get_tokenizer()
+        rows = db.session.execute(text(
+            "SELECT rowid, snippet(post_search, 0, :start, :end, '…', :tokens) "
+            'FROM post_search WHERE post_search MATCH :q AND rowid IN (%s)'
+            % ', '.join(str(int(id)) for id in ids)),
+            {'q': query, 'start': MARK_START, 'end': MARK_END,
+             'tokens': SNIPPET_TOKENS})
+        terms = tokenizer.terms(keywords)
+        return dict((id, highlight(tokenizer.detokenize(snippet, MARK_START, MARK_END, terms)))
+                    for id, snippet in rows)
+    return dict((id, excerpt(body)) for id, body in db.session.query(
+        Post.id, Post.body).filter(Post.id.in_(ids)))
+
+
+def search_posts(keywords, page=1, per_page=10):
+    """按相关度返回一页匹配的文章，total和高亮摘要(post.snippet)都来自索引
+
+    命中的id列表按规范化后的查询缓存，翻页只需为当前页生成摘要
+    """
+    from .models import Post
+    query = match_query(keywords)
+    if not query:
+        return Pagination(None, page, per_page, 0, [])
+    ids = search_cache.get(query, lambda: ranked_ids(query, keywords))
+    page_ids = ids[(page - 1) * per_page:page * per_page]
+    if not page_ids:
+        return Pagination(None, page, per_page, len(ids), [])
+    texts = snippets(query, keywords, page_ids)
+    posts = dict((post.id, post) for post in Post.query.filter(Post.id.in_(page_ids)))
+    items = []
+    for id in page_ids:
+        if id in posts:
+            posts[id].snippet = texts.get(id, '')
+            items.append(posts[id])
+    return Pagination(None, page, per_page, len(ids), Post.preload(items))
@@ -0,0 +1,25 @@
+#!/usr/bin/python3
+
+"""进程内检索结果缓存：按规范化后的查询缓存排好序的文章id，文章有改动即整体失效"""
+
+from .ttl_cache import TTLCache
+
+
+class SearchCache(TTLCache):
+    def __init__(self, app=None):
+        TTLCache.__init__(self, max_size=1000, ttl=300)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config.get('FLASKY_SEARCH_CACHE_SIZE', 1000)
+        self.ttl = app.config.get('FLASKY_SEARCH_CACHE_TTL', 300)
+        self.clear()
+
+    def get(self, query, load):
+        """返回query命中的全部id，未命中时调用load()从索引读取"""
+        return TTLCache.get(self, query, lambda: tuple(load()))
+
+    def stats(self):
+        return {'queries': len(self), 'hits': self.hits,
+                'misses': self.misses, 'generation': self._generation}
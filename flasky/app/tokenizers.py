@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+
+"""检索分词器：建索引和查询必须使用同一个分词器"""
+
+import re
+
+CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+TOKEN_RE = re.compile('([%s]+)|([^\\W_%s]+)' % (CJK, CJK))
+CJK_RE = re.compile('[%s]' % CJK)
+# 原文中相邻的中文和拉丁文之间没有分隔时，索引里补的分隔符；
+# 控制字符对FTS5是分隔符，还原摘要时去掉，不会和原文里的空格混淆
+JOIN = '\x1f'
+
+
+def strip_markers(text, start, end):
+    """去掉高亮标记和补的分隔符，返回(文本, 每个字符是否高亮)"""
+    chars, flags, on = [], [], False
+    for char in text:
+        if char == start:
+            on = True
+        elif char == end:
+            on = False
+        elif char != JOIN:
+            chars.append(char)
+            flags.append(on)
+    return ''.join(chars), flags
+
+
+def clip_marks(text, flags, terms):
+    """高亮只落在与查询词相同的字符上
+
+    前缀匹配会命中整个二元组，比如查“气”时高亮“气很”；一段高亮里
+    找不到任何查询词时(如大小写以外的折叠)原样保留
+    """
+    lower = text.lower()
+    if not terms or len(lower) != len(text):
+        return flags
+    hit = [False] * len(text)
+    for term in terms:
+        i = lower.find(term)
+        while i != -1:
+            hit[i:i + len(term)] = [True] * len(term)
+            i = lower.find(term, i + 1)
+    flags, i = list(flags), 0
+    while i < len(text):
+        j = i
+        while j < len(text) and flags[j]:
+            j += 1
+        if j > i and any(hit[i:j]):
+            flags[i:j] = hit[i:j]
+        i = j + 1
+    return flags
+
+
+def segments(text, flags):
+    result = []
+    for char, flag in zip(text, flags):
+        if result and result[-1][1] == flag:
+            result[-1][0] += char
+        else:
+            result.append([char, flag])
+    return [tuple(segment) for segment in result]
+
+
+class WordTokenizer:
+    """按非字母数字字符切分，中文整段作为一个词"""
+    name = 'word'
+
+    def tokenize(self, text, query=False):
+        return [match.group(0).lower() for match in TOKEN_RE.finditer(text or '')]
+
+    def index_piece(self, run, word):
+        return run or word
+
+    def index_text(self, text):
+        """写入索引的文本：词与词之间保留原文的标点和空白，摘要才能还原成原文"""
+        text = text or ''
+        parts, last = [], 0
+        for match in TOKEN_RE.finditer(text):
+            parts.append(text[last:match.start()] or (JOIN if parts else ''))
+            parts.append(self.index_piece(*match.groups()))
+            last = match.end()
+        parts.append(text[last:])
+        return ''.join(parts)
+
+    def terms(self, keywords):
+        """查询词在原文中的样子：按字母数字与中文切开，不拆二元组"""
+        return [match.group(0).lower() for match in TOKEN_RE.finditer(keywords or '')]
+
+    def detokenize(self, text, start, end, terms=()):
+        """把索引摘要还原成原文，返回[(片段, 是否高亮), ...]；高亮裁剪到terms"""
+        chars, flags = strip_markers(text, start, end)
+        return segments(chars, clip_marks(chars, flags, terms))
+
+    def query_phrase(self, keyword):
+        tokens = self.tokenize(keyword, query=True)
+        if not tokens:
+            return None
+        return '"%s"' % ' '.join(tokens)
+
+
+class BigramTokenizer(WordTokenizer):
+    """中日韩文字切成相邻两字的二元组，拉丁文字按词切分
+
+    建索引时每段中文末尾再补一个单字，查询单字时用前缀匹配也能命中段尾
+    """
+    name = 'bigram'
+
+    def tokenize(self, text, query=False):
+        tokens = []
+        for match in TOKEN_RE.finditer(text or ''):
+            run, word = match.groups()
+            if word:
+                tokens.append(word.lower())
+            elif len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+                if not query:
+                    tokens.append(run[-1])
+        return tokens
+
+    def index_piece(self, run, word):
+        if word or len(run) == 1:
+            return run or word
+        return ' '.join([run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]])
+
+    def detokenize(self, text, start, end, terms=()):
+        # 同一段中文的相邻二元组重叠一个字，合并回原文；段尾的单字表示这一段结束
+        text, flags = strip_markers(text, start, end)
+        chars, marks = [], []
+        last, in_run = 0, False
+        for match in TOKEN_RE.finditer(text):
+            run = match.group(1)
+            gap = text[last:match.start()]
+            if run and in_run and gap == ' ' and chars[-1] == run[0]:
+                marks[-1] = marks[-1] or flags[match.start()]
+                chars.extend(run[1:])
+                marks.extend(flags[match.start() + 1:match.end()])
+                in_run = len(run) > 1
+            else:
+                chars.extend(text[last:match.end()])
+                marks.extend(flags[last:match.end()])
+                in_run = bool(run) and len(run) > 1
+            last = match.end()
+        chars.extend(text[last:])
+        marks.extend(flags[last:])
+        chars = ''.join(chars)
+        return segments(chars, clip_marks(chars, marks, terms))
+
+    def query_phrase(self, keyword):
+        tokens = self.tokenize(keyword, query=True)
+        if not tokens:
+            return None
+        phrase = '"%s"' % ' '.join(tokens)
+        if len(tokens[-1]) == 1 and CJK_RE.match(tokens[-1]):
+            # 单字只在二元组的开头出现，用前缀匹配
+            phrase += ' *'
+        return phrase
+
+
+TOKENIZERS = {
+    'word': WordTokenizer(),
+    'bigram': BigramTokenizer(),
+}
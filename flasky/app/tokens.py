@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+"""确认、重置密码、修改邮箱用的签名令牌
+
+每种用途用不同的salt，一种用途的令牌不能拿去做另一件事；
+序列化器按(密钥, 用途, 有效期)缓存，派生出的签名密钥也只计算一次
+"""
+
+import re
+from functools import lru_cache
+from flask import current_app
+from itsdangerous import BadData, Signer
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+
+PURPOSES = ('confirm', 'reset', 'change_email')
+# JWS紧凑格式：三段base64url，用点分隔
+TOKEN_RE = re.compile(r'^[A-Za-z0-9_=-]+\.[A-Za-z0-9_=-]+\.[A-Za-z0-9_=-]+$')
+MAX_TOKEN_LENGTH = 1024
+
+
+class KeyCachingSigner(Signer):
+    def derive_key(self):
+        if not hasattr(self, '_key'):
+            self._key = Signer.derive_key(self)
+        return self._key
+
+
+class TokenSerializer(Serializer):
+    default_signer = KeyCachingSigner
+
+    def __init__(self, *args, **kwargs):
+        super(TokenSerializer, self).__init__(*args, **kwargs)
+        self._signers = {}
+
+    def make_signer(self, salt=None, algorithm=None):
+        key = (salt, algorithm)
+        signer = self._signers.get(key)
+        if signer is None:
+            signer = self._signers[key] = super(TokenSerializer, self).make_signer(
+                salt, algorithm)
+        return signer
+
+
+@lru_cache(maxsize=32)
+def serializer(secret_key, purpose, expires_in=None):
+    if purpose not in PURPOSES:
+        raise ValueError('unknown token purpose: %s' % purpose)
+    return TokenSerializer(secret_key, expires_in, salt='flasky.' + purpose)
+
+
+def generate(purpose, data, expiration=3600):
+    s = serializer(current_app.config['SECRET_KEY'], purpose, expiration)
+    return s.dumps(data).decode('utf-8')
+
+
+def load(purpose, token):
+    """返回令牌中的数据；格式不对、签名无效或已过期时返回None"""
+    # 明显不是令牌的输入在做任何解码和HMAC之前就拒绝
+    if not isinstance(token, str) or len(token) > MAX_TOKEN_LENGTH \
+            or not TOKEN_RE.match(token):
+        return None
+    try:
+        data = serializer(current_app.config['SECRET_KEY'], purpose).loads(
+            token.encode('ascii'))
+    except BadData:
+        return None
+    return data if isinstance(data, dict) else None
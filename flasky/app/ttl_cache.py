@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+"""进程内缓存的公共部分：带过期时间的LRU，以及随会话提交失效的事件"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """按键缓存load()的结果，过期或超出容量后淘汰
+
+    其他进程的写入不会通知本进程，只能靠过期时间兜底；
+    读库期间本进程有失效时不写入缓存，避免存入旧数据
+    """
+
+    def __init__(self, max_size=1000, ttl=0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 键 -> (过期时间, 值)
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def invalidate(self, *keys):
+        """失效指定的键，不指定时全部失效"""
+        with self._lock:
+            self._generation += 1
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def get(self, key, load):
+        """返回key对应的值，未命中时调用load()；load()返回None时不缓存"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+        value = load()
+        if value is None or self.ttl <= 0 or self.max_size <= 0:
+            return value
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+
+def invalidate_on_commit(target, cache, *keys):
+    """立即失效，target所在的会话提交或回滚后再失效一次
+
+    提交之前其他请求仍可能读到旧数据并写回缓存，所以提交后还要再清一次；
+    cache须提供invalidate(*keys)，不给keys时全部失效
+    """
+    from . import db
+    cache.invalidate(*keys)
+    session = db.object_session(target)
+    if session is None:
+        return
+    pending = session.info.setdefault('ttl_cache', {})
+    if not keys:
+        pending[cache] = None
+    elif cache not in pending:
+        pending[cache] = set(keys)
+    elif pending[cache] is not None:
+        pending[cache].update(keys)
+
+
+def on_session_end(session):
+    for cache, keys in session.info.pop('ttl_cache', {}).items():
+        cache.invalidate(*(keys or ()))
+
+
+def register():
+    from . import db
+    for name in ('after_commit', 'after_rollback'):
+        if not db.event.contains(db.session, name, on_session_end):
+            db.event.listen(db.session, name, on_session_end)
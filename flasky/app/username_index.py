@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+"""进程内用户名前缀索引：按小写用户名排序的列表，二分查找前缀"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+
+
+class UsernameIndex:
+    def __init__(self, app=None):
+        self.ttl = 300
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._entries = []  # 排好序的 (小写用户名, 用户名, id)
+        self._loaded_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # 其他进程的注册和改名不会通知本进程，过期后整体重新加载
+        self.ttl = app.config.get('FLASKY_USERNAME_INDEX_TTL', 300)
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._loaded_at = None
+
+    def load(self):
+        from .models import User
+        from . import db
+        entries = sorted((username.lower(), username, id) for id, username in
+                         db.session.query(User.id, User.username).filter(
+                             User.username.isnot(None)))
+        with self._lock:
+            self._entries = entries
+            self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        return self._loaded_at is not None and \
+            time.monotonic() - self._loaded_at <= self.ttl
+
+    def _ensure_loaded(self):
+        """同一时间只有一个线程重新加载；已有旧索引时其他线程不等待，先用旧索引"""
+        if self._fresh():
+            return
+        # 还没有索引时只能等第一次加载完成
+        if not self._reloading.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if not self._fresh():
+                self.load()
+        finally:
+            self._reloading.release()
+
+    def complete(self, prefix, limit=10):
+        """返回以prefix开头(不区分大小写)的用户，按用户名排序"""
+        prefix = prefix.strip().lower()
+        if not prefix or limit <= 0:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            entries = self._entries
+            i = bisect_left(entries, (prefix,))
+            result = []
+            while i < len(entries) and len(result) < limit \
+                    and entries[i][0].startswith(prefix):
+                result.append((entries[i][2], entries[i][1]))
+                i += 1
+        return result
+
+    def _add(self, id, username):
+        if username:
+            insort(self._entries, (username.lower(), username, id))
+
+    def _remove(self, id, username):
+        if username:
+            entry = (username.lower(), username, id)
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def stats(self):
+        return {'users': len(self._entries),
+                'loaded': self._loaded_at is not None}
+
+    # 以下为同步User写入的事件，改动在提交后才应用到索引，回滚则丢弃
+    def register(self, user_model):
+        from . import db
+        db.event.listen(user_model, 'after_insert', self.on_insert)
+        db.event.listen(user_model, 'after_update', self.on_update)
+        db.event.listen(user_model, 'after_delete', self.on_delete)
+        db.event.listen(db.session, 'after_commit', self.on_commit)
+        db.event.listen(db.session, 'after_rollback', self.on_rollback)
+
+    def _pending(self, target):
+        from . import db
+        session = db.object_session(target)
+        if session is None:
+            return []
+        return session.info.setdefault('username_index', [])
+
+    def on_insert(self, mapper, connection, target):
+        self._pending(target).append((target.id, None, target.username))
+
+    def on_update(self, mapper, connection, target):
+        from . import db
+        history = db.inspect(target).attrs.username.history
+        if history.has_changes():
+            old = history.deleted[0] if history.deleted else None
+            self._pending(target).append((target.id, old, target.username))
+
+    def on_delete(self, mapper, connection, target):
+        from . import db
+        history = db.inspect(target).attrs.username.history
+        old = history.deleted[0] if history.deleted else target.username
+        self._pending(target).append((target.id, old, None))
+
+    def on_commit(self, session):
+        changes = session.info.pop('username_index', None)
+        if not changes or self._loaded_at is None:
+            return
+        with self._lock:
+            for id, old, new in changes:
+                self._remove(id, old)
+                self._add(id, new)
+
+    def on_rollback(self, session):
+        session.info.pop('username_index', None)
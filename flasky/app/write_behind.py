@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+"""点赞写缓冲：合并同一用户的反复点赞/取消，按时间或数量批量写库"""
+
+import atexit
+import threading
+
+
+class ZanBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._pending = {}  # (author_id, kind, target_id) -> [库中状态, 目标状态]
+        self._deltas = {}   # (kind, target_id) -> 尚未写库的点赞数变化
+        self._inflight = {}  # 正在写库、尚未提交的条目，结构同_pending
+        self._flushes = 0    # 已结束的刷新次数
+        self._flushing = threading.Lock()
+        self._timer = None
+        self._atexit = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('FLASKY_ZAN_WRITE_BEHIND', False)
+        self.flush_size = app.config.get('FLASKY_ZAN_FLUSH_SIZE', 100)
+        self.flush_interval = app.config.get('FLASKY_ZAN_FLUSH_INTERVAL', 2.0)
+        # 测试里会反复init_app，只注册一次
+        if self.enabled and not self._atexit:
+            atexit.register(self.flush)
+            self._atexit = True
+
+    def like(self, author_id, post_id=None, comment_id=None):
+        self._set(author_id, post_id, comment_id, True)
+
+    def unlike(self, author_id, post_id=None, comment_id=None):
+        self._set(author_id, post_id, comment_id, False)
+
+    def delta(self, kind, target_id):
+        return self._deltas.get((kind, target_id), 0)
+
+    def _set(self, author_id, post_id, comment_id, liked):
+        from .models import Zan
+        from . import db
+        if not self.enabled:
+            if liked:
+                Zan.like(author_id, post_id=post_id, comment_id=comment_id)
+            else:
+                Zan.unlike(author_id, post_id=post_id, comment_id=comment_id)
+            return
+        kind, target_id = ('post', post_id) if post_id is not None else ('comment', comment_id)
+        key = (author_id, kind, target_id)
+        stored, flushes = None, None
+        while True:
+            with self._lock:
+                entry = self._pending.get(key)
+                if entry is None and key in self._inflight:
+                    # 正在写库的一条，提交后库中就是它的目标状态，不能读库
+                    stored = self._inflight[key][1]
+                    entry = self._pending[key] = [stored, stored]
+                if entry is None and stored is not None and flushes == self._flushes:
+                    # 读库期间没有刷新结束，读到的就是库中状态
+                    entry = self._pending[key] = [stored, stored]
+                if entry is not None:
+                    if entry[1] != liked:
+                        step = 1 if liked else -1
+                        self._deltas[(kind, target_id)] = self.delta(kind, target_id) + step
+                        entry[1] = liked
+                    if entry[0] == entry[1]:
+                        # 点了又取消，相互抵消，不必写库
+                        del self._pending[key]
+                    full = len(self._pending) >= self.flush_size
+                    if not full and self._pending and self._timer is None:
+                        self._timer = threading.Timer(self.flush_interval, self.flush)
+                        self._timer.daemon = True
+                        self._timer.start()
+                    break
+                flushes = self._flushes
+            stored = db.session.query(Zan.id).filter_by(
+                author_id=author_id, post_id=post_id,
+                comment_id=comment_id).first() is not None
+        if full:
+            self.flush()
+
+    def flush(self):
+        from .models import Zan
+        from . import db
+        with self._flushing:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                # 写库期间_set()从这里取库中状态，不去读还没提交的库
+                self._inflight = pending
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            try:
+                if pending:
+                    with db.get_engine(self.app).begin() as connection:
+                        for (author_id, kind, target_id), (stored, liked) in pending.items():
+                            target = {kind + '_id': target_id}
+                            if liked:
+                                Zan.like(author_id, connection=connection, **target)
+                            else:
+                                Zan.unlike(author_id, connection=connection, **target)
+            except Exception:
+                # 写库失败时放回缓冲，库中仍是原来的状态，等下一次刷新
+                with self._lock:
+                    for key, (stored, liked) in pending.items():
+                        entry = self._pending.get(key)
+                        if entry is None:
+                            self._pending[key] = [stored, liked]
+                        else:
+                            entry[0] = stored
+                            if entry[0] == entry[1]:
+                                del self._pending[key]
+                    self._inflight = {}
+                    self._flushes += 1
+                raise
+            # 提交之后再扣除已写库的变化量，页面上的数字不会来回跳
+            with self._lock:
+                for (author_id, kind, target_id), (stored, liked) in pending.items():
+                    key = (kind, target_id)
+                    self._deltas[key] = self.delta(kind, target_id) - (1 if liked else -1)
+                    if not self._deltas[key]:
+                        del self._deltas[key]
+                self._inflight = {}
+                self._flushes += 1
+        return len(pending)
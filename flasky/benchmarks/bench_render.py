@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+
+"""正文渲染的微基准：每次新建解析器和净化器 vs 按线程复用
+
+    python -m benchmarks.bench_render [篇数]
+"""
+
+import sys
+import time
+import bleach
+from faker import Faker
+from markdown import markdown
+from app.render import PROFILES, RenderEngine
+
+
+def fresh_render(body, profile):
+    """原来的写法，每次调用都重新创建Markdown、Cleaner和Linker"""
+    return bleach.linkify(bleach.clean(
+        markdown(body, output_format='html'),
+        tags=PROFILES[profile], strip=True))
+
+
+def corpus(count):
+    fake = Faker('zh-cn')
+    bodies = []
+    for i in range(count):
+        if i % 2:
+            bodies.append(fake.sentence())  # 评论一般很短
+        else:
+            bodies.append('## %s\n\n%s **%s** %s\n\n* %s\n* %s' % (
+                fake.sentence(), fake.text(), fake.word(), fake.url(),
+                fake.sentence(), fake.sentence()))
+    return bodies
+
+
+def timed(render, bodies, profile):
+    start = time.perf_counter()
+    for body in bodies:
+        render(body, profile)
+    return time.perf_counter() - start
+
+
+def main(count=2000):
+    bodies = corpus(count)
+    engine = RenderEngine()
+    for body in bodies[:20]:
+        assert engine.render(body, 'post') == fresh_render(body, 'post')
+    for profile in sorted(PROFILES):
+        fresh = timed(fresh_render, bodies, profile)
+        reused = timed(engine.render, bodies, profile)
+        print('%-8s fresh %.3fs (%5.0f/s)  reused %.3fs (%5.0f/s)  %.2fx' % (
+            profile, fresh, count / fresh, reused, count / reused, fresh / reused))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
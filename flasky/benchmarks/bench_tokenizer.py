@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+"""检索分词与建索引的吞吐量测试
+
+    python -m benchmarks.bench_tokenizer [文章数]
+"""
+
+import sqlite3
+import sys
+import time
+from faker import Faker
+from app.tokenizers import TOKENIZERS
+
+
+def corpus(count):
+    fake = Faker('zh-cn')
+    return [fake.text(max_nb_chars=400) for i in range(count)]
+
+
+def bench(tokenizer, texts):
+    start = time.perf_counter()
+    rows = [(i, tokenizer.index_text(text)) for i, text in enumerate(texts, 1)]
+    tokenize_time = time.perf_counter() - start
+
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE VIRTUAL TABLE post_search USING fts5(body)')
+    start = time.perf_counter()
+    connection.executemany('INSERT INTO post_search (rowid, body) VALUES (?, ?)', rows)
+    connection.commit()
+    index_time = time.perf_counter() - start
+    connection.close()
+    return tokenize_time, index_time
+
+
+def main(count=5000):
+    texts = corpus(count)
+    size = sum(len(text.encode('utf-8')) for text in texts)
+    print('%d posts, %d bytes' % (count, size))
+    for name, tokenizer in sorted(TOKENIZERS.items()):
+        tokenize_time, index_time = bench(tokenizer, texts)
+        total = tokenize_time + index_time
+        print('%-8s tokenize %.3fs  index %.3fs  %8.0f posts/s  %6.2f MB/s' % (
+            name, tokenize_time, index_time, count / total,
+            size / total / 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
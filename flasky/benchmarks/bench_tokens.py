@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+"""令牌生成与校验吞吐量：每次新建序列化器 vs 缓存的序列化器
+
+    python -m benchmarks.bench_tokens [次数]
+"""
+
+import sys
+import time
+from flask import Flask
+from itsdangerous import BadData
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+from app import tokens
+
+SECRET_KEY = 'benchmark secret'
+
+
+def fresh_roundtrip(data):
+    token = Serializer(SECRET_KEY, 3600).dumps(data).decode('utf-8')
+    return Serializer(SECRET_KEY).loads(token.encode('utf-8'))
+
+
+def cached_roundtrip(data):
+    return tokens.load('confirm', tokens.generate('confirm', data))
+
+
+def fresh_reject(token):
+    try:
+        return Serializer(SECRET_KEY).loads(token.encode('utf-8'))
+    except BadData:
+        return None
+
+
+def cached_reject(token):
+    return tokens.load('confirm', token)
+
+
+def timed(fn, arg, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(arg)
+    return count / (time.perf_counter() - start)
+
+
+def main(count=20000):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = SECRET_KEY
+    with app.app_context():
+        data = {'confirm': 42}
+        garbage = 'not-a-token'
+        forged = tokens.generate('reset', data)
+        print('round trip   fresh %8.0f/s  cached %8.0f/s' % (
+            timed(fresh_roundtrip, data, count), timed(cached_roundtrip, data, count)))
+        print('malformed    fresh %8.0f/s  cached %8.0f/s' % (
+            timed(fresh_reject, garbage, count), timed(cached_reject, garbage, count)))
+        print('bad sig      fresh %8.0f/s  cached %8.0f/s' % (
+            timed(fresh_reject, forged, count), timed(cached_reject, forged, count)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
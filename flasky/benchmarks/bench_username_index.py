@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+
+"""用户名前缀索引的查询延迟
+
+    python -m benchmarks.bench_username_index [用户数]
+"""
+
+import random
+import string
+import sys
+import time
+from app.username_index import UsernameIndex
+
+
+def main(count=1000000):
+    random.seed(0)
+    index = UsernameIndex()
+    index._entries = sorted(
+        (name.lower(), name, id) for id, name in enumerate(
+            ''.join(random.choice(string.ascii_lowercase) for i in range(10))
+            for j in range(count)))
+    index._loaded_at = time.monotonic()
+    index.ttl = float('inf')
+    prefixes = [''.join(random.choice(string.ascii_lowercase) for i in range(n))
+                for n in (1, 2, 3) for j in range(1000)]
+    start = time.perf_counter()
+    for prefix in prefixes:
+        index.complete(prefix, 10)
+    lookup = (time.perf_counter() - start) / len(prefixes)
+    start = time.perf_counter()
+    for j in range(100):
+        index._add(count + j, 'user%d' % j)
+    insert = (time.perf_counter() - start) / 100
+    print('%d users  lookup %.1fus  insert %.1fus' % (count, lookup * 1e6, insert * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
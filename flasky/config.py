@@ -20,6 +20,34 @@ class Config:
     FLASKY_ADMIN = username
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     DEBUG_TB_INTERCEPT_REDIRECTS = False 
+    FLASKY_KEYSET_PAGINATION = False
+    FLASKY_ZAN_WRITE_BEHIND = False
+    FLASKY_ZAN_FLUSH_SIZE = 100
+    FLASKY_ZAN_FLUSH_INTERVAL = 2.0
+    FLASKY_FOLLOW_CACHE_SIZE = 10000
+    FLASKY_FOLLOW_CACHE_TTL = 60
+    FLASKY_SEARCH_TOKENIZER = 'bigram'
+    FLASKY_SEARCH_CACHE_SIZE = 1000
+    FLASKY_SEARCH_CACHE_TTL = 300
+    FLASKY_USERNAME_INDEX_TTL = 300
+    FLASKY_RENDER_CACHE_SIZE = 10000
+    FLASKY_IDENTITY_CACHE_SIZE = 10000
+    FLASKY_IDENTITY_CACHE_TTL = 0
+    FLASKY_PRESENCE_TRACKING = True
+    FLASKY_PRESENCE_FLUSH_INTERVAL = 60
+    FLASKY_PRESENCE_DRIFT = 300
+    FLASKY_PRESENCE_FLUSH_SIZE = 500
+    FLASKY_PASSWORD_METHOD = 'pbkdf2:sha256'
+    FLASKY_PASSWORD_ITERATIONS = 150000
+    FLASKY_PASSWORD_WORKERS = 2
+    FLASKY_PASSWORD_MAX_PENDING = 64
+    FLASKY_PERMISSION_CLAIMS = False
+    FLASKY_ROLE_VERSION_TTL = 5
+    FLASKY_MAIL_WORKERS = 2
+    FLASKY_MAIL_QUEUE_SIZE = 100
+    FLASKY_MAIL_SUBMIT_TIMEOUT = 5.0
+    FLASKY_MAIL_BATCH_SIZE = 20
+    FLASKY_MAIL_IDLE_TIMEOUT = 1.0
     
     @staticmethod
     def init_app(app):
@@ -32,6 +60,10 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    FLASKY_PASSWORD_ITERATIONS = 1000
+    FLASKY_PASSWORD_WORKERS = 0
+    FLASKY_MAIL_WORKERS = 0
+    MAIL_DEBUG = False  # 测试中不打印SMTP会话
     SQLALCHEMY_DATABASE_URI =\
     'sqlite://'
 
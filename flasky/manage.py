@@ -2,9 +2,10 @@
 
 """主脚本"""
 from app import create_app, db
-from app.models import Role, User, Post, Parent_child, Zan, Comment, Follow
+from app.models import Role, User, Post, Parent_child, Zan, Comment, Follow, Timeline
 from app.email import send_email
 from flask_migrate import Migrate
+import click
 
 
 app = create_app('default')
@@ -12,7 +13,7 @@ migrate = Migrate(app, db)
 
 @app.shell_context_processor  
 def make_shell_context():
-    return dict(db=db, User=User, Role=Role, Post=Post, Parent_child=Parent_child, Zan=Zan, Comment=Comment, Follow=Follow)
+    return dict(db=db, User=User, Role=Role, Post=Post, Parent_child=Parent_child, Zan=Zan, Comment=Comment, Follow=Follow, Timeline=Timeline)
 
 
 @app.cli.command()
@@ -21,3 +22,74 @@ def test():
     import unittest
     tests = unittest.TestLoader().discover('tests')
     unittest.TextTestRunner(verbosity=2).run(tests)
+
+
+@app.cli.command()
+def recount():
+    """Recompute the denormalized like, comment and follow counters."""
+    repaired = {'post': Post.recount(),
+                'comments': Comment.recount(),
+                'users': User.recount()}
+    db.session.commit()
+    for table, rows in repaired.items():
+        print('%s: %d rows repaired' % (table, rows))
+
+
+@app.cli.command()
+def reindex():
+    """Rebuild the post search index with the configured tokenizer."""
+    from app.search import rebuild_index
+    with db.engine.begin() as connection:
+        count = rebuild_index(connection)
+    print('search index rebuilt: %d posts' % count)
+
+
+@app.cli.command()
+@click.option('--chunk-size', default=500, help='Rows per render batch.')
+@click.option('--workers', default=None, type=int,
+              help='Render processes, 0 renders inline (default: CPU count).')
+@click.option('--checkpoint', default='rerender.json',
+              help='Progress file used to resume an interrupted run.')
+@click.option('--all', 'force', is_flag=True,
+              help='Re-render rows already at the current renderer version.')
+def rerender(chunk_size, workers, checkpoint, force):
+    """Re-render stale body_html of posts and comments."""
+    import json
+    import os
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from app.render import RENDERER_VERSION, InlineExecutor, rerender as run
+    state = {}
+    if os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            state = json.load(f)
+        if state.get('version') != RENDERER_VERSION or state.get('force') != force:
+            state = {}
+    state.update(version=RENDERER_VERSION, force=force)
+    executor = InlineExecutor() if workers == 0 else ProcessPoolExecutor(workers)
+    try:
+        with db.engine.connect() as connection:
+            for model, profile in ((Post, 'post'), (Comment, 'comment')):
+                table = model.__table__
+                done, start = 0, time.monotonic()
+                for last_id, count in run(connection, table, profile, executor,
+                                          chunk_size, state.get(table.name, 0), force):
+                    done += count
+                    state[table.name] = last_id
+                    with open(checkpoint, 'w') as f:
+                        json.dump(state, f)
+                    print('%s: %d rows, up to id %d, %.0f rows/s' % (
+                        table.name, done, last_id, done / (time.monotonic() - start)))
+                print('%s: %d rows re-rendered in %.1fs' % (
+                    table.name, done, time.monotonic() - start))
+    finally:
+        executor.shutdown()
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+@app.cli.command()
+def rebuild_timelines():
+    """Rebuild the materialized idols timelines."""
+    count = Timeline.rebuild()
+    print('timelines rebuilt: %d rows' % count)
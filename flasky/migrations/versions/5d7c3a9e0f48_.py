@@ -0,0 +1,28 @@
+"""empty message
+
+Revision ID: 5d7c3a9e0f48
+Revises: e4a9f2c83b16
+Create Date: 2026-10-18 13:05:29.610337
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7c3a9e0f48'
+down_revision = 'e4a9f2c83b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5(body)')
+    op.execute("INSERT INTO post_search (rowid, body) SELECT id, coalesce(body, '') FROM post")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE IF EXISTS post_search')
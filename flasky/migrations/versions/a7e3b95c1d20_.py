@@ -0,0 +1,27 @@
+"""empty message
+
+Revision ID: a7e3b95c1d20
+Revises: 5d7c3a9e0f48
+Create Date: 2026-10-18 14:21:07.318205
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3b95c1d20'
+down_revision = '5d7c3a9e0f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 索引由紧随其后的f2c86d4b7a35按分词器重建一次，这里不重复重建
+    pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DELETE FROM post_search')
+    op.execute("INSERT INTO post_search (rowid, body) SELECT id, coalesce(body, '') FROM post")
@@ -0,0 +1,78 @@
+"""empty message
+
+Revision ID: f2c86d4b7a35
+Revises: a7e3b95c1d20
+Create Date: 2026-10-18 15:02:44.871026
+
+"""
+import re
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c86d4b7a35'
+down_revision = 'a7e3b95c1d20'
+branch_labels = None
+depends_on = None
+
+# 本次迁移时的分词规则快照，之后app.tokenizers的改动不影响这里
+CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+TOKEN_RE = re.compile('([%s]+)|([^\\W_%s]+)' % (CJK, CJK))
+JOIN = '\x1f'
+
+
+def index_piece(run, word, bigram):
+    if word:
+        return word
+    if not bigram or len(run) == 1:
+        return run
+    return ' '.join([run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]])
+
+
+def index_text(text, bigram):
+    # 词与词之间保留原文的标点和空白，原文没有分隔处补JOIN
+    text = text or ''
+    parts, last = [], 0
+    for match in TOKEN_RE.finditer(text):
+        parts.append(text[last:match.start()] or (JOIN if parts else ''))
+        parts.append(index_piece(*match.groups(), bigram))
+        last = match.end()
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+def tokens_text(text, bigram):
+    # 上一版本的索引文本：只有词，以空格分隔
+    return ' '.join(index_piece(*match.groups(), bigram).lower()
+                    for match in TOKEN_RE.finditer(text or ''))
+
+
+def rebuild(index_text):
+    connection = op.get_bind()
+    if connection.dialect.name != 'sqlite':
+        return
+    bigram = current_app.config.get('FLASKY_SEARCH_TOKENIZER', 'bigram') == 'bigram'
+    connection.execute('DELETE FROM post_search')
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.text(
+            'SELECT id, body FROM post WHERE id > :id ORDER BY id LIMIT 1000'),
+            id=last_id).fetchall()
+        if not rows:
+            break
+        connection.execute(sa.text('INSERT INTO post_search (rowid, body) '
+                                   'VALUES (:id, :body)'),
+                           [{'id': id, 'body': index_text(body, bigram)}
+                            for id, body in rows])
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    # 索引文本保留原文标点以便生成摘要，重建一次
+    rebuild(index_text)
+
+
+def downgrade():
+    rebuild(tokens_text)
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+"""会话权限声明测试"""
+
+import unittest
+from flask import session
+from flask_login import login_user
+from app import create_app, db, permission_claims
+from app.claims import CLAIM_KEY
+from app.models import User, Role, Permission
+
+
+class ClaimsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_PERMISSION_CLAIMS'] = True
+        self.app.config['FLASKY_ROLE_VERSION_TTL'] = 60
+        permission_claims.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.u)
+        db.session.commit()
+
+    def tearDown(self):
+        permission_claims.enabled = False
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def check(self, claim, permission):
+        # 模拟一个新请求：会话中带着上一次签发的声明
+        with self.app.test_request_context('/'):
+            login_user(self.u)
+            if claim is not None:
+                session[CLAIM_KEY] = claim
+            reloads = permission_claims.reloads
+            allowed = permission_claims.can(permission)
+            return allowed, session[CLAIM_KEY], permission_claims.reloads - reloads
+
+    def test_claim_reused(self): # 声明有效时不重新读取角色
+        allowed, claim, reloads = self.check(None, Permission.WRITE)
+        self.assertTrue(allowed)
+        self.assertEqual(reloads, 1)
+        allowed, claim, reloads = self.check(claim, Permission.MODERATE)
+        self.assertFalse(allowed)
+        self.assertEqual(reloads, 0)
+
+    def test_role_change_invalidates(self): # 角色权限变化或用户换角色后重新读取
+        allowed, claim, reloads = self.check(None, Permission.WRITE)
+        role = Role.query.filter_by(name='User').first()
+        role.remove_permission(Permission.WRITE)
+        db.session.commit()
+        allowed, claim, reloads = self.check(claim, Permission.WRITE)
+        self.assertFalse(allowed)
+        self.assertEqual(reloads, 1)
+        self.u.role = Role.query.filter_by(name='Administrator').first()
+        db.session.commit()
+        allowed, claim, reloads = self.check(claim, Permission.ADMIN)
+        self.assertTrue(allowed)
+        self.assertEqual(reloads, 1)
+
+    def test_role_removed_invalidates(self): # 去掉用户的角色后旧声明失效
+        allowed, claim, reloads = self.check(None, Permission.WRITE)
+        self.assertTrue(allowed)
+        self.u.role_id = None
+        db.session.commit()
+        allowed, claim, reloads = self.check(claim, Permission.WRITE)
+        self.assertFalse(allowed)
+        self.assertEqual(reloads, 1)
+
+    def test_other_user(self): # 别的用户的声明不能用
+        allowed, claim, reloads = self.check(None, Permission.WRITE)
+        claim = dict(claim, user='999', permissions=0xff)
+        allowed, claim, reloads = self.check(claim, Permission.ADMIN)
+        self.assertFalse(allowed)
+        self.assertEqual(reloads, 1)
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+"""评论回复关系测试"""
+
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment, Parent_child
+
+
+class CommentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        # parent_id既可能是文章id也可能是评论id，让两者错开
+        self.post = Post(id=10, body='hello', author=self.u1)
+        db.session.add_all([self.u1, self.u2, self.post])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_reply_index(self): # 回复文章与回复评论
+        c1 = Comment(body='first', post=self.post, author=self.u2)
+        c2 = Comment(body='second', post=self.post, author=self.u1)
+        db.session.add_all([c1, c2])
+        db.session.commit()
+        db.session.add_all([Parent_child(parent_id=self.post.id, child_id=c1.id),
+                            Parent_child(parent_id=c1.id, child_id=c2.id)])
+        db.session.commit()
+        self.assertEqual(Comment.reply_index([c1, c2]),
+                         {c1.id: 'john', c2.id: 'susan'})
+        self.assertEqual(Comment.reply_index([]), {})
+
+    def test_floor_numbers(self): # 楼层号按文章递增，删除后不重号
+        c1 = self.post.add_comment('first', self.u2, self.post.id)
+        db.session.commit()
+        c2 = self.post.add_comment('second', self.u1, c1.id)
+        db.session.commit()
+        self.assertEqual((c1.float_id, c2.float_id), (1, 2))
+        self.assertEqual(Comment.reply_index([c2]), {c2.id: 'susan'})
+        db.session.delete(c2)
+        db.session.commit()
+        c3 = self.post.add_comment('third', self.u1, self.post.id)
+        db.session.commit()
+        self.assertEqual(c3.float_id, 3)
+        self.assertEqual(self.post.comment_count, 2)
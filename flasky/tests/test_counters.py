@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+
+"""计数列测试"""
+
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment, Zan
+
+
+class CounterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        self.post = Post(body='hello', author=self.u1)
+        db.session.add_all([self.u1, self.u2, self.post])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_zan_and_comment_counters(self): # 点赞与评论计数随增删变化
+        c = Comment(body='nice', post=self.post, author=self.u2)
+        z1 = Zan(author=self.u2, type='post', status=True, post=self.post)
+        z2 = Zan(author=self.u1, type='comment', status=True, comment=c)
+        db.session.add_all([c, z1, z2])
+        db.session.commit()
+        self.assertEqual((self.post.zan_count, self.post.comment_count), (1, 1))
+        self.assertEqual(c.zan_count, 1)
+        db.session.delete(z1)
+        db.session.delete(z2)
+        db.session.commit()
+        self.assertEqual((self.post.zan_count, c.zan_count), (0, 0))
+
+    def test_follow_counters(self): # 关注与粉丝计数
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual((self.u1.followed_count, self.u2.followers_count), (1, 1))
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertEqual((self.u1.followed_count, self.u2.followers_count), (0, 0))
+
+    def test_recount_repairs(self): # 批量修复计数
+        db.session.add(Zan(author=self.u2, type='post', status=True, post=self.post))
+        self.u1.follow(self.u2)
+        db.session.commit()
+        Post.query.update({Post.zan_count: 7})
+        User.query.update({User.followers_count: 0})
+        db.session.commit()
+        self.assertEqual(Post.recount(), 1)
+        self.assertEqual(User.recount(), 1)
+        self.assertEqual(Comment.recount(), 0)
+        db.session.commit()
+        self.assertEqual(self.post.zan_count, 1)
+        self.assertEqual(self.u2.followers_count, 1)
+
+    def test_like_is_idempotent(self): # 重复点赞与取消点赞
+        self.assertTrue(Zan.like(self.u2.id, post_id=self.post.id))
+        self.assertFalse(Zan.like(self.u2.id, post_id=self.post.id))
+        db.session.commit()
+        self.assertEqual(self.post.zan_count, 1)
+        self.assertEqual(Zan.query.count(), 1)
+        self.assertTrue(Zan.unlike(self.u2.id, post_id=self.post.id))
+        self.assertFalse(Zan.unlike(self.u2.id, post_id=self.post.id))
+        db.session.commit()
+        self.assertEqual(self.post.zan_count, 0)
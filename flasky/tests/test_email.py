@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+
+"""邮件发送队列测试，SMTP服务器用标准库smtpd在本地模拟"""
+
+import socket
+import threading
+import unittest
+from flask_mail import Message
+from app import create_app, db, mail, mail_queue
+from app.email import send_email
+from app.models import User, Role
+
+try:
+    import asyncore
+    import smtpd
+except ImportError:  # Python 3.12起标准库不再提供
+    smtpd = None
+
+
+if smtpd is not None:
+    class StandInServer(smtpd.SMTPServer):
+        def __init__(self):
+            smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+            self.port = self.socket.getsockname()[1]
+            self.messages = []
+            self.sessions = 0
+            self.gate = threading.Event()
+            self.gate.set()
+
+        def handle_accepted(self, conn, addr):
+            self.sessions += 1
+            smtpd.SMTPServer.handle_accepted(self, conn, addr)
+
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            self.gate.wait(5)
+            self.messages.append((rcpttos, data))
+
+
+class EmailTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.u)
+        db.session.commit()
+
+    def tearDown(self):
+        mail_queue.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def send(self, count):
+        with self.app.test_request_context('/'):
+            return [send_email('user%d@example.com' % i, 'test', 'auth/email/confirm',
+                               user=self.u, token='t') for i in range(count)]
+
+    def test_inline(self): # 不开工作线程时直接发送，正文与HTML都在
+        mail_queue.reset_stats()
+        with mail.record_messages() as outbox:
+            self.assertEqual(self.send(1), [True])
+        self.assertIn('john', outbox[0].body)
+        self.assertIn('john', outbox[0].html)
+        self.assertEqual(mail_queue.stats()['sent'], 1)
+
+    def test_inline_failure(self): # 不开工作线程时发送失败返回False
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=port,
+                               MAIL_USE_SSL=False, MAIL_USE_TLS=False,
+                               MAIL_SUPPRESS_SEND=False)
+        mail.init_app(self.app)
+        mail_queue.reset_stats()
+        self.assertEqual(self.send(1), [False])
+        self.assertEqual(mail_queue.stats()['failed'], 1)
+
+    def start_server(self, **config):
+        if smtpd is None:
+            self.skipTest('smtpd not available')
+        server = StandInServer()
+        thread = threading.Thread(target=asyncore.loop,
+                                  kwargs={'timeout': 0.05, 'map': None})
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(server.close)
+        self.app.config.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=server.port,
+                               MAIL_USE_SSL=False, MAIL_USE_TLS=False,
+                               MAIL_USERNAME=None, MAIL_PASSWORD=None,
+                               MAIL_SUPPRESS_SEND=False, **config)
+        mail.init_app(self.app)
+        mail_queue.init_app(self.app)
+        mail_queue.reset_stats()
+        return server
+
+    def test_pool_reuses_connections(self): # 工作线程复用连接成批发送，关闭时发完队列
+        server = self.start_server(FLASKY_MAIL_WORKERS=2)
+        self.assertEqual(self.send(10), [True] * 10)
+        mail_queue.shutdown()
+        stats = mail_queue.stats()
+        self.assertEqual((stats['sent'], stats['failed']), (10, 0))
+        self.assertEqual(len(server.messages), 10)
+        self.assertLessEqual(stats['connections'], 2)
+        self.assertLessEqual(server.sessions, 2)
+
+    def test_backpressure(self): # 队列满时等待，超时则放弃
+        server = self.start_server(FLASKY_MAIL_WORKERS=1, FLASKY_MAIL_QUEUE_SIZE=1)
+        server.gate.clear()
+        mail_queue.submit_timeout = 2
+        self.assertEqual(self.send(2), [True, True])
+        mail_queue.submit_timeout = 0.05
+        self.assertEqual(self.send(1), [False])
+        server.gate.set()
+        mail_queue.shutdown()
+        stats = mail_queue.stats()
+        self.assertEqual((stats['sent'], stats['rejected']), (2, 1))
+        self.assertEqual(self.send(1), [False])
+
+    def test_bad_message_does_not_stop_worker(self): # 单封邮件出错不影响后面的邮件
+        server = self.start_server(FLASKY_MAIL_WORKERS=1)
+        # 没有收件人，flask_mail发送时抛出AssertionError而不是SMTPException
+        self.assertTrue(mail_queue.submit(Message('broken', sender='a@example.com')))
+        self.assertEqual(self.send(3), [True] * 3)
+        mail_queue.join()
+        stats = mail_queue.stats()
+        self.assertEqual((stats['sent'], stats['failed']), (3, 1))
+        self.assertEqual(len(server.messages), 3)
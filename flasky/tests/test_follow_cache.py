@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+
+"""关注关系缓存测试"""
+
+import unittest
+from app import create_app, db, follow_graph
+from app.models import User, Role, Follow
+
+
+class FollowGraphCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_follow_graph_cache(self): # 关注关系缓存随关注与取消关注失效
+        self.assertFalse(self.u1.is_following(self.u2))
+        misses = follow_graph.misses
+        self.assertFalse(self.u1.is_following(self.u2))
+        self.assertEqual(follow_graph.misses, misses)
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertTrue(self.u1.is_following(self.u2))
+        self.assertTrue(self.u2.is_followed_by(self.u1))
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertFalse(self.u1.is_following(self.u2))
+
+    def test_follow_ignores_stale_cache(self): # 缓存过期未刷新时关注仍以数据库为准
+        self.assertFalse(self.u1.is_following(self.u2))
+        # 模拟另一进程写入：不经过映射事件，缓存里仍是未关注
+        db.session.execute(Follow.__table__.insert().values(
+            follower_id=self.u1.id, followed_id=self.u2.id))
+        self.assertFalse(self.u1.is_following(self.u2))
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual(Follow.query.count(), 1)
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+
+"""密码散列服务测试"""
+
+import unittest
+from app import create_app, db, hasher
+from app.hashing import PasswordHasher
+from app.models import User, Role
+
+
+class HashingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        hasher.init_app(self.app)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_configured_cost(self): # 按配置的迭代次数散列
+        u = User(password='cat')
+        self.assertTrue(u.password_hash.startswith('pbkdf2:sha256:1000$'))
+        self.assertFalse(hasher.needs_rehash(u.password_hash))
+
+    def test_rehash_on_login(self): # 迭代次数调整后，验证成功时透明地重新散列
+        u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        old, rehashed = u.password_hash, hasher.rehashed
+        hasher.method = 'pbkdf2:sha256:2000'
+        self.assertFalse(u.verify_password('dog'))
+        self.assertEqual(u.password_hash, old)
+        self.assertTrue(u.verify_password('cat'))
+        db.session.commit()
+        self.assertTrue(u.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertTrue(u.verify_password('cat'))
+        self.assertEqual(hasher.rehashed, rehashed + 1)
+
+    def test_thread_pool(self): # 在线程池中计算，并统计延迟分位数
+        self.app.config.update(FLASKY_PASSWORD_WORKERS=1, FLASKY_PASSWORD_MAX_PENDING=2)
+        pool = PasswordHasher(self.app)
+        try:
+            password_hash = pool.hash('cat')
+            self.assertTrue(pool.verify(password_hash, 'cat'))
+            self.assertFalse(pool.verify(password_hash, 'dog'))
+        finally:
+            pool.shutdown()
+        stats = pool.stats()
+        self.assertEqual(stats['hash']['count'], 1)
+        self.assertEqual(stats['verify']['count'], 2)
+        self.assertIsNotNone(stats['verify']['p99_ms'])
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+
+"""登录用户加载与缓存测试"""
+
+import unittest
+from datetime import datetime
+from app import create_app, db, identity_cache
+from app.models import User, Role, Permission, load_user
+
+
+class IdentityCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(u)
+        db.session.commit()
+        self.id = u.id
+        db.session.remove()
+        # 默认不缓存，这里按开启缓存的部署测试
+        self.app.config['FLASKY_IDENTITY_CACHE_TTL'] = 30
+        identity_cache.init_app(self.app)
+        self.queries = []
+        db.event.listen(db.engine, 'before_cursor_execute', self.count_query)
+
+    def tearDown(self):
+        db.event.remove(db.engine, 'before_cursor_execute', self.count_query)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries.append(statement)
+
+    def request(self):
+        # 每个请求开始时会话是空的
+        db.session.remove()
+        self.queries = []
+        user = load_user(str(self.id))
+        self.assertTrue(user.can(Permission.FOLLOW))
+        self.assertFalse(user.is_administrator())
+        return user
+
+    def test_role_joined(self): # 未命中时用户和角色一条查询
+        identity_cache.ttl = 0
+        self.request()
+        self.assertEqual(len(self.queries), 1)
+
+    def test_cached(self): # 命中缓存时不查询数据库
+        self.request()
+        user = self.request()
+        self.assertEqual(self.queries, [])
+        self.assertEqual(user.username, 'john')
+        self.assertIs(db.session.merge(user), user)
+
+    def test_cached_without_role(self): # 没有角色的用户命中缓存时也不查询
+        u = User.query.get(self.id)
+        u.role = None
+        db.session.commit()
+        for i in range(2):
+            db.session.remove()
+            self.queries = []
+            user = load_user(str(self.id))
+            self.assertIsNone(user.role)
+            self.assertFalse(user.can(Permission.FOLLOW))
+        self.assertEqual(self.queries, [])
+
+    def test_invalidation(self): # 资料、密码、角色变化后失效，只更新last_seen不失效
+        user = self.request()
+        user.last_seen = datetime.utcnow()
+        db.session.commit()
+        self.request()
+        self.assertEqual(self.queries, [])
+        user = self.request()
+        user.password = 'dog'
+        db.session.commit()
+        user = self.request()
+        self.assertEqual(len(self.queries), 1)
+        self.assertTrue(user.verify_password('dog'))
+        role = Role.query.filter_by(name='User').first()
+        role.remove_permission(Permission.FOLLOW)
+        db.session.commit()
+        db.session.remove()
+        self.assertFalse(load_user(str(self.id)).can(Permission.FOLLOW))
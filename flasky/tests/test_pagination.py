@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+"""游标分页测试"""
+
+import unittest
+from datetime import datetime, timedelta
+from flask import render_template_string
+from app import create_app, db
+from app.models import User, Role, Post
+from app.pagination import keyset_paginate, encode_cursor, decode_cursor
+from app.main.views import USER_POSTS_KEYS, user_posts_key
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        u = User(email='john@example.com', username='john', password='cat')
+        now = datetime.utcnow()
+        # 两篇文章时间相同，检验id作为第二排序键
+        self.posts = [Post(body=str(i), author=u, timestamp=now - timedelta(minutes=i // 2))
+                      for i in range(7)]
+        db.session.add_all(self.posts)
+        db.session.commit()
+        self.keys = [(Post.timestamp, True), (Post.id, True)]
+        self.expected = Post.query.order_by(Post.timestamp.desc(), Post.id.desc()).all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cursor_round_trip(self): # 游标编码与解码
+        values = [True, datetime(2019, 9, 1, 12, 0, 0, 5), 42]
+        self.assertEqual(decode_cursor(encode_cursor(values), 3), values)
+        self.assertIsNone(decode_cursor('not-a-cursor', 3))
+
+    def test_walk_forward_and_back(self): # 向后翻页再向前翻页
+        p1 = keyset_paginate(Post.query, self.keys, 3)
+        self.assertFalse(p1.has_prev)
+        p2 = keyset_paginate(Post.query, self.keys, 3, after=p1.next_cursor)
+        p3 = keyset_paginate(Post.query, self.keys, 3, after=p2.next_cursor)
+        self.assertEqual(p1.items + p2.items + p3.items, self.expected)
+        self.assertFalse(p3.has_next)
+        back = keyset_paginate(Post.query, self.keys, 3, before=p3.prev_cursor)
+        self.assertEqual(back.items, p2.items)
+        self.assertTrue(back.has_prev and back.has_next)
+        last = keyset_paginate(Post.query, self.keys, 3, last=True)
+        self.assertEqual(last.items, self.expected[-3:])
+
+    def test_widget(self): # 分页导航使用游标链接
+        with self.app.test_request_context('/'):
+            p = keyset_paginate(Post.query, self.keys, 3)
+            html = render_template_string(
+                '{% import "main/_macros.html" as macros %}'
+                '{{ macros.pagination_widget(pagination, "main.index") }}',
+                pagination=p)
+        self.assertIn('after=' + p.next_cursor, html)
+
+    def test_user_posts_keys(self): # 置顶文章在前，top为NULL的旧数据按未置顶处理
+        self.posts[5].top = True
+        self.posts[1].top = None
+        self.posts[2].top = False
+        db.session.commit()
+        expected = [self.posts[5]] + [p for p in self.expected if p is not self.posts[5]]
+        items, cursor = [], None
+        while True:
+            p = keyset_paginate(Post.query, USER_POSTS_KEYS, 2, after=cursor,
+                                key=user_posts_key)
+            items += p.items
+            if not p.has_next:
+                break
+            cursor = p.next_cursor
+        self.assertEqual(items, expected)
+        back = keyset_paginate(Post.query, USER_POSTS_KEYS, 2, before=cursor,
+                               key=user_posts_key)
+        self.assertEqual(back.items, expected[3:5])
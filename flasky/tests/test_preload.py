@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+"""文章列表批量预加载测试"""
+
+import unittest
+from flask import render_template
+from app import create_app, db
+from app.models import User, Role, Post, Zan
+
+
+class PreloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        users = [User(email='u%d@example.com' % i, username='u%d' % i, password='cat')
+                 for i in range(5)]
+        posts = [Post(body='post %d' % i, author=users[i]) for i in range(5)]
+        db.session.add_all(users + posts)
+        db.session.add_all([Zan(author=users[0], type='post', status=True, post=posts[0]),
+                            Zan(author=users[1], type='post', status=True, post=posts[0])])
+        db.session.commit()
+        db.session.expunge_all()
+        self.queries = []
+        db.event.listen(db.engine, 'before_cursor_execute', self.count_query)
+
+    def tearDown(self):
+        db.event.remove(db.engine, 'before_cursor_execute', self.count_query)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries.append(statement)
+
+    def render(self, preload):
+        with self.app.test_request_context('/'):
+            posts = Post.query.order_by(Post.id).all()
+            self.queries = []
+            if preload:
+                Post.preload(posts)
+            return render_template('main/_posts.html', posts=posts)
+
+    def test_render_is_unchanged(self): # 预加载不改变渲染结果
+        plain = self.render(preload=False)
+        db.session.expunge_all()
+        self.assertEqual(self.render(preload=True), plain)
+
+    def test_query_count(self): # 作者一条查询，点赞数读计数列
+        self.render(preload=True)
+        self.assertEqual(len(self.queries), 1)
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+"""在线状态跟踪测试"""
+
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, presence
+from app.models import User, Role
+
+
+class PresenceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['FLASKY_PRESENCE_FLUSH_INTERVAL'] = 60
+        presence.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.u)
+        db.session.commit()
+        self.queries = []
+        db.event.listen(db.engine, 'before_cursor_execute', self.count_query)
+
+    def tearDown(self):
+        db.event.remove(db.engine, 'before_cursor_execute', self.count_query)
+        presence.flush()
+        presence._seen.clear()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_query(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries.append(statement)
+
+    def stored(self):
+        return db.session.query(User.last_seen).filter_by(id=self.u.id).scalar()
+
+    def test_ping_does_not_write(self): # 访问时间落后不多时只记在内存
+        before = self.u.last_seen
+        self.queries = []
+        self.u.ping()
+        self.assertEqual(self.queries, [])
+        self.assertGreater(self.u.live_last_seen, before)
+        self.assertEqual(presence.flush(), 0)
+        self.assertEqual(self.stored(), before)
+
+    def test_drift_is_flushed(self): # 落后超过阈值时批量写库
+        self.u.last_seen = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+        self.u.ping()
+        self.assertEqual(presence.flush(), 1)
+        self.assertEqual(self.stored(), self.u.live_last_seen)
+
+    def test_idle_users_are_written_and_dropped(self): # 一个周期内没再访问的用户写库后移出内存
+        self.u.ping()
+        seen = presence.last_seen(self.u.id)
+        presence._seen[self.u.id][0] = seen - timedelta(seconds=61)
+        self.assertEqual(presence.flush(), 1)
+        self.assertEqual(self.stored(), seen - timedelta(seconds=61))
+        self.assertIsNone(presence.last_seen(self.u.id))
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+"""写入时渲染正文的测试"""
+
+import unittest
+from app import create_app, db, render_cache
+from app.models import User, Role, Post, Comment
+from app.render import RENDERER_VERSION, render, rerender, InlineExecutor
+
+
+class RenderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_profiles(self): # 文章与评论使用不同的标签白名单
+        body = '# 标题\n\n**粗体**<script>alert(1)</script>'
+        self.assertIn('<h1>标题</h1>', render(body, 'post'))
+        self.assertNotIn('<h1>', render(body, 'comment'))
+        self.assertNotIn('<script>', render(body, 'post'))
+        self.assertIn('<strong>粗体</strong>', render(body, 'comment'))
+
+    def test_engine_reused(self): # 复用的解析器不残留上一次的状态，每个线程各有一份
+        import threading
+        from app.render import engine
+        first = engine()
+        self.assertEqual(engine().render('[x][ref]\n\n[ref]: http://a.com', 'comment'),
+                         '<a href="http://a.com" rel="nofollow">x</a>')
+        self.assertEqual(engine().render('[x][ref]', 'comment'), '[x][ref]')
+        self.assertIs(engine(), first)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(engine()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], first)
+
+    def test_rendered_on_write(self): # 写入正文时渲染并记录渲染器版本
+        u = User(email='john@example.com', username='john', password='cat')
+        post = Post(body='*hello* http://example.com', author=u)
+        comment = Comment(body='**hi**', author=u, post=post)
+        db.session.add_all([u, post, comment])
+        db.session.commit()
+        self.assertIn('<em>hello</em>', post.body_html)
+        self.assertIn('href="http://example.com"', post.body_html)
+        self.assertEqual(post.body_html_version, RENDERER_VERSION)
+        self.assertEqual(comment.body_html, '<strong>hi</strong>')
+        self.assertEqual(comment.body_html_version, RENDERER_VERSION)
+        post.body = 'changed'
+        self.assertEqual(post.body_html, '<p>changed</p>')
+
+    def test_memoized(self): # 相同正文只渲染一次，白名单不同分开缓存
+        render_cache.hits = render_cache.misses = 0
+        html = render_cache.render('**same**', 'post')
+        self.assertEqual(render_cache.render('**same**', 'post'), html)
+        self.assertEqual(render_cache.render('**same**', 'comment'),
+                         '<strong>same</strong>')
+        self.assertEqual((render_cache.hits, render_cache.misses), (1, 2))
+        self.assertGreater(render_cache.saved, 0)
+
+    def test_rerender(self): # 分块重新渲染过期的行，可从断点继续
+        u = User(email='john@example.com', username='john', password='cat')
+        posts = [Post(body='*%d*' % i, author=u) for i in range(5)]
+        db.session.add_all([u] + posts)
+        db.session.commit()
+        table = Post.__table__
+        db.session.execute(table.update().where(table.c.id != posts[1].id).values(
+            body_html=None, body_html_version=None))
+        db.session.commit()
+        connection = db.session.connection()
+        chunks = list(rerender(connection, table, 'post', InlineExecutor(),
+                               chunk_size=2, after=posts[0].id))
+        self.assertEqual(chunks, [(posts[3].id, 2), (posts[4].id, 1)])
+        db.session.expire_all()
+        self.assertIsNone(posts[0].body_html)
+        self.assertEqual(posts[2].body_html, '<p><em>2</em></p>')
+        self.assertEqual(posts[4].body_html_version, RENDERER_VERSION)
+
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+"""全文检索测试"""
+
+import unittest
+from app import create_app, db, search_cache
+from app.models import User, Role, Post
+from app.search import search_posts, match_query
+from app.tokenizers import TOKENIZERS
+
+
+class SearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.u)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add(self, body):
+        post = Post(body=body, author=self.u)
+        db.session.add(post)
+        db.session.commit()
+        return post
+
+    def test_match_query(self): # 关键词分词后组成短语
+        self.assertEqual(match_query('flask "sql'), '"flask" "sql"')
+        self.assertEqual(match_query('学习Python 梦'), '"学习 python" "梦" *')
+        self.assertEqual(match_query('   '), '')
+
+    def test_chinese_substrings(self): # 中文按二元组索引，任意子串都能检索
+        p1 = self.add('梦想有可能成为现实，生活正是因此而有趣')
+        p2 = self.add('人生苦短，我学Python')
+        self.assertEqual(search_posts('成为现实').items, [p1])
+        self.assertEqual(search_posts('趣').items, [p1])
+        self.assertEqual(search_posts('学python').items, [p2])
+        self.assertEqual(search_posts('现实生活').total, 0)
+
+    def test_index_follows_writes(self): # 增删改同步到索引
+        p1 = self.add('learning flask and python')
+        p2 = self.add('python tips')
+        self.assertEqual(set(search_posts('python').items), {p1, p2})
+        self.assertEqual(search_posts('flask python').items, [p1])
+        p2.body = 'sqlalchemy tips'
+        db.session.commit()
+        self.assertEqual(search_posts('python').items, [p1])
+        self.assertEqual(search_posts('sqlalchemy').items, [p2])
+        db.session.delete(p1)
+        db.session.commit()
+        self.assertEqual(search_posts('python').total, 0)
+
+    def test_snippets(self): # 摘要由索引生成，命中部分高亮并转义正文
+        self.add('梦想有可能成为现实，<b>生活</b>正是因此而有趣')
+        post = search_posts('成为现实').items[0]
+        self.assertEqual(str(post.snippet), '梦想有可能<mark>成为现实</mark>'
+                         '，&lt;b&gt;生活&lt;/b&gt;正是因此而有趣')
+        self.assertEqual(search_posts('梦想 python').total, 0)
+
+    def test_snippet_clipped_to_query(self): # 前缀匹配的二元组只高亮查询的字
+        self.add('今天天气很好')
+        self.add('Python很好用')
+        self.assertEqual(str(search_posts('气').items[0].snippet),
+                         '今天天<mark>气</mark>很好')
+        self.assertEqual(str(search_posts('Python很').items[0].snippet),
+                         '<mark>Python很</mark>好用')
+        self.assertEqual(str(search_posts('python').items[0].snippet),
+                         '<mark>Python</mark>很好用')
+
+    def test_cache(self): # 重复查询走缓存，文章增删改后失效
+        p1 = self.add('python tips')
+        search_cache.hits = search_cache.misses = 0
+        self.assertEqual(search_posts('Python').items, [p1])
+        self.assertEqual(search_posts(' python ').items, [p1])
+        self.assertEqual((search_cache.hits, search_cache.misses), (1, 1))
+        p2 = self.add('python tricks')
+        self.assertEqual(search_posts('python').total, 2)
+        p1.body = 'flask tips'
+        db.session.commit()
+        self.assertEqual(search_posts('python').items, [p2])
+        db.session.delete(p2)
+        db.session.commit()
+        self.assertEqual(search_posts('python').total, 0)
+        self.assertEqual(search_cache.misses, 4)
+
+    def test_pagination(self): # 分页与总数
+        for i in range(5):
+            self.add('python %d' % i)
+        page = search_posts('python', page=2, per_page=2)
+        self.assertEqual(page.total, 5)
+        self.assertEqual(len(page.items), 2)
+        self.assertTrue(page.has_next)
+
+
+class TokenizerTestCase(unittest.TestCase):
+    def test_bigram(self): # 中文二元组，拉丁文按词
+        tokenizer = TOKENIZERS['bigram']
+        self.assertEqual(tokenizer.tokenize('人生苦短, I love Python'),
+                         ['人生', '生苦', '苦短', '短', 'i', 'love', 'python'])
+        self.assertEqual(tokenizer.tokenize('人生苦短', query=True),
+                         ['人生', '生苦', '苦短'])
+        self.assertEqual(tokenizer.tokenize('我'), ['我'])
+
+    def test_detokenize(self): # 二元组合并回原文，高亮落在原文字符上
+        tokenizer = TOKENIZERS['bigram']
+        text = tokenizer.index_text('人生苦短，我学Python')
+        self.assertEqual(text, '人生 生苦 苦短 短，我学 学\x1fPython')
+        self.assertEqual(tokenizer.detokenize(text.replace('生苦', '[生苦]'), '[', ']'),
+                         [('人', False), ('生苦', True), ('短，我学Python', False)])
+        # 原文里的空格保留
+        text = tokenizer.index_text('我学 Python')
+        self.assertEqual(tokenizer.detokenize(text, '[', ']'), [('我学 Python', False)])
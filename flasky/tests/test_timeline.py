@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+"""关注时间线测试"""
+
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        db.session.add_all([self.u1, self.u2])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_post_fans_out_to_followers(self): # 新文章写入粉丝的时间线
+        self.u1.follow(self.u2)
+        db.session.commit()
+        p = Post(body='hello', author=self.u2)
+        db.session.add(p)
+        db.session.commit()
+        self.assertEqual(self.u1.idols_posts.all(), [p])
+        self.assertEqual(self.u2.idols_posts.count(), 0)
+
+    def test_follow_backfills_and_unfollow_prunes(self): # 关注回填，取消关注删除
+        p = Post(body='hello', author=self.u2)
+        db.session.add(p)
+        db.session.commit()
+        self.u1.follow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u1.idols_posts.all(), [p])
+        self.u1.unfollow(self.u2)
+        db.session.commit()
+        self.assertEqual(self.u1.idols_posts.count(), 0)
+
+    def test_delete_post_and_rebuild(self): # 删除文章与重建时间线
+        self.u1.follow(self.u2)
+        p1 = Post(body='one', author=self.u2)
+        p2 = Post(body='two', author=self.u2)
+        db.session.add_all([p1, p2])
+        db.session.commit()
+        db.session.delete(p1)
+        db.session.commit()
+        self.assertEqual(self.u1.idols_posts.all(), [p2])
+        Timeline.query.delete()
+        db.session.commit()
+        self.assertEqual(Timeline.rebuild(), 1)
+        self.assertEqual(self.u1.idols_posts.all(), [p2])
+
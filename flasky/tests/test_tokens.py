@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+
+"""签名令牌测试"""
+
+import unittest
+from app import create_app, db, tokens
+from app.models import User, Role
+
+
+class TokenTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u = User(email='john@example.com', username='john', password='cat')
+        self.other = User(email='susan@example.com', username='susan', password='dog')
+        db.session.add_all([self.u, self.other])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_confirm(self): # 确认令牌只对本人有效
+        token = self.u.generate_confirmation_token()
+        self.assertFalse(self.other.confirm(token))
+        self.assertTrue(self.u.confirm(token))
+        self.assertTrue(self.u.confirmed)
+
+    def test_purpose_salt(self): # 一种用途的令牌不能用于另一种
+        token = tokens.generate('reset', {'confirm': self.u.id})
+        self.assertIsNone(tokens.load('confirm', token))
+        self.assertFalse(self.u.confirm(token))
+        self.assertTrue(User.reset_password(self.u.generate_reset_token(), 'fish'))
+        self.assertTrue(self.u.verify_password('fish'))
+
+    def test_change_email(self): # 修改邮箱
+        token = self.u.generate_email_change_token('john2@example.com')
+        self.assertFalse(self.other.change_email(token))
+        self.assertTrue(self.u.change_email(token))
+        self.assertEqual(self.u.email, 'john2@example.com')
+
+    def test_rejected(self): # 过期、篡改和格式错误的令牌
+        token = self.u.generate_confirmation_token(expiration=-1)
+        self.assertIsNone(tokens.load('confirm', token))
+        token = self.u.generate_confirmation_token()
+        self.assertIsNone(tokens.load('confirm', token[:-2] + 'AA'))
+        for bad in ['', 'abc', 'a.b', 'a.b.c.d', '<script>.x.y', 'a' * 2000, None]:
+            self.assertIsNone(tokens.load('confirm', bad))
+        self.assertFalse(User.reset_password('a.b.c', 'fish'))
+
+    def test_serializer_cached(self): # 同一密钥、用途和有效期共用一个序列化器
+        key = self.app.config['SECRET_KEY']
+        self.assertIs(tokens.serializer(key, 'confirm', 3600),
+                      tokens.serializer(key, 'confirm', 3600))
+        with self.assertRaises(ValueError):
+            tokens.serializer(key, 'unknown')
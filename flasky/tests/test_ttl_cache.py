@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+"""缓存公共部分测试"""
+
+import time
+import unittest
+from app import create_app, db
+from app.models import User, Role
+from app.ttl_cache import TTLCache, invalidate_on_commit
+
+
+class TTLCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_lru_and_expiry(self): # 超出容量淘汰最久未用的，过期后重新加载
+        cache = TTLCache(max_size=2, ttl=60)
+        for key in 'abc':
+            cache.get(key, lambda: key.upper())
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a', lambda: 'again'), 'again')
+        cache.ttl = 0.01
+        cache.invalidate()
+        cache.get('a', lambda: 1)
+        time.sleep(0.02)
+        self.assertEqual(cache.get('a', lambda: 2), 2)
+        self.assertIsNone(cache.get('none', lambda: None))
+        self.assertEqual(cache.misses, 7)
+
+    def test_invalidated_while_loading(self): # 加载期间有失效时不写入缓存
+        cache = TTLCache(ttl=60)
+
+        def load():
+            cache.invalidate('a')
+            return 'old'
+        self.assertEqual(cache.get('a', load), 'old')
+        self.assertEqual(cache.get('a', lambda: 'new'), 'new')
+
+    def test_invalidate_on_commit(self): # 提交后再失效一次
+        cache = TTLCache(ttl=60)
+        u = User(email='john@example.com', username='john', password='cat')
+        db.session.add(u)
+        invalidate_on_commit(u, cache, 'a')
+        cache.get('a', lambda: 'stale')
+        db.session.commit()
+        self.assertEqual(cache.get('a', lambda: 'fresh'), 'fresh')
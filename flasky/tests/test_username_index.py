@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+"""用户名前缀索引测试"""
+
+import threading
+import unittest
+from app import create_app, db, username_index
+from app.models import User, Role
+
+
+class UsernameIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        for i, name in enumerate(['john', 'Johnny', 'jonas', 'susan']):
+            db.session.add(User(email='%d@example.com' % i, username=name,
+                                password='cat'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def names(self, prefix, limit=10):
+        return [username for id, username in username_index.complete(prefix, limit)]
+
+    def test_prefix(self): # 前缀不区分大小写，结果有序且受limit限制
+        self.assertEqual(self.names('JO'), ['john', 'Johnny', 'jonas'])
+        self.assertEqual(self.names('joh', limit=1), ['john'])
+        self.assertEqual(self.names('x'), [])
+        self.assertEqual(self.names(' '), [])
+
+    def test_sync_with_writes(self): # 注册、改名、删除在提交后同步，回滚不影响
+        self.assertEqual(self.names('s'), ['susan'])
+        db.session.add(User(email='5@example.com', username='sam', password='cat'))
+        db.session.commit()
+        self.assertEqual(self.names('s'), ['sam', 'susan'])
+        susan = User.query.filter_by(username='susan').first()
+        susan.username = 'alice'
+        db.session.commit()
+        self.assertEqual(self.names('s'), ['sam'])
+        self.assertEqual(self.names('a'), ['alice'])
+        db.session.add(User(email='6@example.com', username='sid', password='cat'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.names('s'), ['sam'])
+        db.session.delete(User.query.filter_by(username='sam').first())
+        db.session.commit()
+        self.assertEqual(self.names('s'), [])
+
+    def test_single_flight_reload(self): # 过期后只有一个线程重新加载，其他线程先用旧索引
+        self.assertEqual(self.names('s'), ['susan'])
+        # 模拟其他进程注册：不经过映射事件，本进程的索引不知道
+        db.session.execute(User.__table__.insert().values(
+            email='5@example.com', username='sam'))
+        db.session.commit()
+        username_index._loaded_at -= username_index.ttl + 1
+        loading, done = threading.Event(), threading.Event()
+
+        def hold():
+            with username_index._reloading:
+                loading.set()
+                done.wait(5)
+        thread = threading.Thread(target=hold)
+        thread.start()
+        loading.wait(5)
+        try:
+            self.assertEqual(self.names('s'), ['susan'])
+        finally:
+            done.set()
+            thread.join()
+        self.assertEqual(self.names('s'), ['sam', 'susan'])
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+"""点赞写缓冲测试"""
+
+import os
+import tempfile
+import threading
+import unittest
+from app import create_app, db, zan_buffer
+from app.models import User, Role, Post, Zan
+
+
+class ZanBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = self.create_app()
+        self.app.config['FLASKY_ZAN_WRITE_BEHIND'] = True
+        self.app.config['FLASKY_ZAN_FLUSH_INTERVAL'] = 60
+        zan_buffer.init_app(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        Role.insert_roles()
+        self.u1 = User(email='john@example.com', username='john', password='cat')
+        self.u2 = User(email='susan@example.com', username='susan', password='dog')
+        self.post = Post(body='hello', author=self.u1)
+        db.session.add_all([self.u1, self.u2, self.post])
+        db.session.commit()
+
+    def create_app(self):
+        return create_app('testing')
+
+    def tearDown(self):
+        zan_buffer.flush()
+        zan_buffer.enabled = False
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_pending_likes_are_visible(self): # 未写库的点赞立即可见
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        zan_buffer.like(self.u2.id, post_id=self.post.id)
+        self.assertEqual(Zan.query.count(), 0)
+        self.assertEqual(self.post.live_zan_count, 2)
+        self.assertEqual(zan_buffer.flush(), 2)
+        db.session.expire_all()
+        self.assertEqual(Zan.query.count(), 2)
+        self.assertEqual(self.post.live_zan_count, 2)
+
+    def test_toggles_are_merged(self): # 点赞后取消相互抵消
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        zan_buffer.unlike(self.u1.id, post_id=self.post.id)
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        self.assertEqual(self.post.live_zan_count, 1)
+        self.assertEqual(zan_buffer.flush(), 1)
+        zan_buffer.unlike(self.u1.id, post_id=self.post.id)
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        self.assertEqual(zan_buffer.flush(), 0)
+
+    def test_flush_on_size(self): # 缓冲满时立即写库
+        self.app.config['FLASKY_ZAN_FLUSH_SIZE'] = 2
+        zan_buffer.init_app(self.app)
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        zan_buffer.like(self.u2.id, post_id=self.post.id)
+        self.assertEqual(Zan.query.count(), 2)
+
+
+class ZanBufferFileTestCase(ZanBufferTestCase):
+    """文件数据库：刷新和请求各用各的连接，读不到对方未提交的写入"""
+
+    def create_app(self):
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        app = create_app('testing')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+        return app
+
+    def test_toggle_during_flush(self): # 刷新写库尚未提交时取消点赞，不能丢失
+        zan_buffer.like(self.u1.id, post_id=self.post.id)
+        toggled = []
+
+        def unlike():
+            with self.app.app_context():
+                zan_buffer.unlike(self.u1.id, post_id=self.post.id)
+                db.session.remove()
+            toggled.append(True)
+
+        def before_commit(connection):
+            if not toggled:
+                thread = threading.Thread(target=unlike)
+                thread.start()
+                thread.join(5)
+        db.event.listen(db.engine, 'commit', before_commit)
+        try:
+            self.assertEqual(zan_buffer.flush(), 1)
+        finally:
+            db.event.remove(db.engine, 'commit', before_commit)
+        self.assertTrue(toggled)
+        db.session.expire_all()
+        self.assertEqual(self.post.live_zan_count, 0)
+        self.assertEqual(zan_buffer.flush(), 1)
+        db.session.expire_all()
+        self.assertEqual(Zan.query.count(), 0)
+        self.assertEqual(self.post.live_zan_count, 0)